@@ -0,0 +1,161 @@
+"""Отдача загруженных файлов из MEDIA_ROOT.
+
+Django проверяет путь и права (функция из MEDIA_ACCESS_CHECK), а
+байты по возможности отдаёт веб-сервер: nginx по X-Accel-Redirect
+или Apache/lighttpd по X-Sendfile (настройка MEDIA_ACCEL). Без них
+ответ — FileResponse, который WSGI-сервер отправляет через sendfile,
+с ETag, Last-Modified и поддержкой Range.
+"""
+import mimetypes
+import os
+import re
+import stat as stat_module
+from functools import lru_cache
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseForbidden,
+    StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+from django.utils.module_loading import import_string
+from django.views.decorators.http import require_safe
+
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+@lru_cache
+def _access_check(dotted_path):
+    return import_string(dotted_path)
+
+
+def allowed(request, path):
+    """Можно ли отдать файл.
+
+    Скрытые файлы и служебные каталоги наружу не отдаются никогда.
+    Остальное решает функция check(request, path) из настройки
+    MEDIA_ACCESS_CHECK; без неё все файлы публичные.
+    """
+    if any(part.startswith(".") for part in path.split("/")):
+        return False
+    if not settings.MEDIA_ACCESS_CHECK:
+        return True
+    return _access_check(settings.MEDIA_ACCESS_CHECK)(request, path)
+
+
+def _etag(stat):
+    # Как у nginx: время изменения и размер в шестнадцатеричном виде.
+    return f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+
+
+def _byte_range(request, etag, mtime, size):
+    """Разбирает заголовок Range с одним диапазоном.
+
+    Возвращает (начало, конец включительно), None, если отдавать
+    нужно весь файл, или False для недостижимого диапазона. Диапазон
+    с концом раньше начала неверен и, как велит RFC 9110, просто
+    игнорируется.
+    """
+    match = RANGE_RE.match(request.headers.get("Range", ""))
+    if not match or not any(match.groups()):
+        return None
+    if_range = request.headers.get("If-Range")
+    if if_range and if_range != etag:
+        if parse_http_date_safe(if_range) != int(mtime):
+            return None
+    start, end = match.groups()
+    if not start:
+        if not int(end):
+            return False
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        if end and int(end) < start:
+            return None
+        end = min(int(end or size - 1), size - 1)
+    if start >= size:
+        return False
+    return start, end
+
+
+def _read(file, length):
+    with file:
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _offload(path, fullpath, content_type):
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_ACCEL == "nginx":
+        # Путь в заголовке закодирован: nginx раскодирует его сам.
+        url = settings.MEDIA_ACCEL_PREFIX + quote(path)
+        response["X-Accel-Redirect"] = url
+    else:
+        response["X-Sendfile"] = fullpath
+    return response
+
+
+def _send(request, fullpath, stat, etag, content_type):
+    byte_range = _byte_range(request, etag, stat.st_mtime, stat.st_size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{stat.st_size}"
+        return response
+    file = open(fullpath, "rb")
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        file.seek(start)
+        response = StreamingHttpResponse(
+            _read(file, end - start + 1),
+            status=206,
+            content_type=content_type,
+        )
+        response["Content-Length"] = end - start + 1
+        response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
+@require_safe
+def serve(request, path):
+    """Отдаёт файл из MEDIA_ROOT."""
+    if not allowed(request, path):
+        return HttpResponseForbidden()
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(fullpath)
+    except (OSError, ValueError):
+        raise Http404("Файл не найден")
+    if not stat_module.S_ISREG(stat.st_mode):
+        raise Http404("Файл не найден")
+    etag = _etag(stat)
+    last_modified = http_date(stat.st_mtime)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime)
+    )
+    if response is None:
+        content_type, _ = mimetypes.guess_type(fullpath)
+        content_type = content_type or "application/octet-stream"
+        if settings.MEDIA_ACCEL:
+            response = _offload(path, fullpath, content_type)
+        else:
+            response = _send(request, fullpath, stat, etag, content_type)
+    response["ETag"] = etag
+    response["Last-Modified"] = last_modified
+    patch_cache_control(
+        response, public=True, max_age=settings.MEDIA_MAX_AGE
+    )
+    return response
@@ -0,0 +1,72 @@
+"""Защита горячих записей кеша от одновременного пересчёта.
+
+Запись хранится вместе с версией и мягким сроком годности. Когда
+запись устарела, пересчитывает её только тот процесс, который первым
+взял блокировку в кеше, а остальные до этого момента отдают старое
+значение.
+"""
+import time
+
+from django.core.cache import cache
+
+LOCK_KEY = "singleflight-lock:{}"
+STATS_KEY = "singleflight-stats:{}"
+STATS = ("recomputes", "stale_serves")
+LOCK_TIMEOUT = 30
+# Устаревшее значение живёт в кеше ещё столько же, сколько свежее.
+GRACE_FACTOR = 2
+
+
+def record(name):
+    key = STATS_KEY.format(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+def stats():
+    """Возвращает число пересчётов и отдач устаревших значений."""
+    keys = {STATS_KEY.format(name): name for name in STATS}
+    values = cache.get_many(keys)
+    return {name: values.get(key, 0) for key, name in keys.items()}
+
+
+def reset_stats():
+    cache.delete_many([STATS_KEY.format(name) for name in STATS])
+
+
+def acquire(key):
+    """Пытается стать единственным процессом, пересчитывающим key."""
+    return cache.add(LOCK_KEY.format(key), 1, LOCK_TIMEOUT)
+
+
+def release(key):
+    cache.delete(LOCK_KEY.format(key))
+
+
+def get_or_set(key, version, compute, timeout):
+    """Возвращает значение из кеша, пересчитывая его не более чем
+    в одном процессе одновременно."""
+    entry = cache.get(key)
+    if entry is not None:
+        stored_version, fresh_until, value = entry
+        if stored_version == version and fresh_until > time.time():
+            return value
+        if not acquire(key):
+            record("stale_serves")
+            return value
+    elif not acquire(key):
+        # Отдать нечего, поэтому считаем сами, но не сохраняем.
+        return compute()
+    try:
+        value = compute()
+        cache.set(
+            key,
+            (version, time.time() + timeout, value),
+            timeout * GRACE_FACTOR,
+        )
+        record("recomputes")
+    finally:
+        release(key)
+    return value
@@ -0,0 +1,52 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from core import singleflight
+
+register = template.Library()
+
+
+class SingleFlightNode(template.Node):
+    def __init__(self, nodelist, timeout, fragment_name, vary_on, version):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+        self.version = version
+
+    def render(self, context):
+        timeout = int(self.timeout.resolve(context))
+        key = make_template_fragment_key(
+            self.fragment_name,
+            [var.resolve(context) for var in self.vary_on],
+        )
+        version = self.version.resolve(context) if self.version else None
+        return singleflight.get_or_set(
+            key, version, lambda: self.nodelist.render(context), timeout
+        )
+
+
+@register.tag("singleflight")
+def do_singleflight(parser, token):
+    """Кеширует фрагмент как {% cache %}, но пересчитывает устаревший
+    фрагмент только в одном процессе.
+
+    {% singleflight timeout name [vary_on ...] [version=var] %}
+    """
+    nodelist = parser.parse(("endsingleflight",))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' tag requires at least 2 arguments."
+        )
+    version = None
+    if bits[-1].startswith("version="):
+        version = parser.compile_filter(bits.pop()[len("version="):])
+    return SingleFlightNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        bits[2],
+        [parser.compile_filter(bit) for bit in bits[3:]],
+        version,
+    )
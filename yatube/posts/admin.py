@@ -1,36 +1,94 @@
 from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
 
 from .models import Comment, Follow, Group, Post
+from .paginator import EstimatedCountPaginator
 
 
-class PostAdmin(admin.ModelAdmin):
+class ScalableAdmin(admin.ModelAdmin):
+    """Общие настройки списков для таблиц на миллионы строк: без
+    точного COUNT(*) и с постоянным числом запросов на страницу."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ("-pk",)
+    empty_value_display = settings.EMPTY_VALUE_DISPLAY
+
+
+class PrefilledAutocompleteSelect(AutocompleteSelect):
+    """Autocomplete, которому выбранный объект передаётся готовым,
+    чтобы строка списка не запрашивала его подпись отдельно."""
+
+    selected = None
+
+    def optgroups(self, name, value, attr=None):
+        selected = self.selected
+        if selected is None or [str(v) for v in value if v] != [
+            str(selected.pk)
+        ]:
+            return super().optgroups(name, value, attr)
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, "", "", False, 0))
+        label = self.choices.field.label_from_instance(selected)
+        options.append(
+            self.create_option(name, selected.pk, label, True, len(options))
+        )
+        return [(None, options, 0)]
+
+
+class PostAdmin(ScalableAdmin):
     list_display = ("pk", "text", "pub_date", "author", "group")
+    list_select_related = ("author", "group")
+    autocomplete_fields = ("author", "group")
     search_fields = ("text",)
     list_filter = ("pub_date",)
     list_editable = ("group",)
-    empty_value_display = settings.EMPTY_VALUE_DISPLAY
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == "group":
+            kwargs["widget"] = PrefilledAutocompleteSelect(
+                db_field, self.admin_site, using=kwargs.get("using")
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_changelist_formset(self, request, **kwargs):
+        formset = super().get_changelist_formset(request, **kwargs)
+
+        class GroupFormSet(formset):
+            def _construct_form(self, i, **kwargs):
+                # Группа уже загружена list_select_related.
+                form = super()._construct_form(i, **kwargs)
+                widget = form.fields["group"].widget
+                getattr(widget, "widget", widget).selected = (
+                    form.instance.group
+                )
+                return form
+
+        return GroupFormSet
 
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ("pk", "title", "slug", "description")
-    search_fields = ("description",)
+    search_fields = ("title", "description")
     list_filter = ("title",)
     empty_value_display = settings.EMPTY_VALUE_DISPLAY
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ScalableAdmin):
     list_display = ("pk", "post", "author", "text", "created")
+    list_select_related = ("post", "author")
+    autocomplete_fields = ("post", "author")
     search_fields = ("text",)
     list_filter = ("created",)
-    empty_value_display = settings.EMPTY_VALUE_DISPLAY
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(ScalableAdmin):
     list_display = ("pk", "user", "author")
-    search_fields = ("user",)
-    list_filter = ("user",)
-    empty_value_display = settings.EMPTY_VALUE_DISPLAY
+    list_select_related = ("user", "author")
+    autocomplete_fields = ("user", "author")
+    search_fields = ("=user__username", "=author__username")
 
 
 admin.site.register(Post, PostAdmin)
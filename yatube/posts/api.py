@@ -0,0 +1,166 @@
+"""JSON API только для чтения: ленты и пост с комментариями.
+
+Выборки те же, что у HTML-страниц в posts.views, но без шаблонов:
+из базы читаются только нужные колонки, страницы листаются курсором
+?after=... ETag собирается из версий областей fragments, которые
+сигналы моделей увеличивают при изменениях, поэтому на совпавший
+If-None-Match ответ 304 отдаётся без запросов за постами.
+"""
+
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.views.decorators.http import require_safe
+
+from . import fragments, groups
+from .models import Comment, Post, TimelineEntry, User
+from .paginator import CursorPaginator
+
+# Меняется вместе с форматом ответов, чтобы старые ETag не совпали.
+FORMAT_VERSION = 1
+POST_FIELDS = ("text", "pub_date", "group", "image", "author__username")
+JSON_PARAMS = {"ensure_ascii": False, "separators": (",", ":")}
+
+
+def _post_data(post):
+    group = groups.get(post.group_id) if post.group_id else None
+    return {
+        "id": post.pk,
+        "text": post.text,
+        "pub_date": post.pub_date,
+        "author": post.author.username,
+        "group": group and group.slug,
+        "image": post.image.url if post.image else None,
+    }
+
+
+def _comment_data(comment):
+    return {
+        "id": comment.pk,
+        "author": comment.author.username,
+        "text": comment.text,
+        "created": comment.created,
+    }
+
+
+def _page(request, queryset, per_page, keys=("pub_date", "id")):
+    paginator = CursorPaginator(queryset, per_page, keys=keys)
+    return paginator.get_page(
+        after=request.GET.get("after"),
+        before=request.GET.get("before"),
+    )
+
+
+def _page_data(page, items):
+    return {
+        "results": items,
+        "next": page.next_cursor,
+        "previous": page.previous_cursor,
+    }
+
+
+def _respond(request, scopes, build):
+    """Отвечает 304 по ETag, иначе вызывает build и отдаёт JSON."""
+    etag = fragments.etag(
+        scopes, FORMAT_VERSION, request.get_full_path(), request.user.pk
+    )
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(build(), json_dumps_params=JSON_PARAMS)
+    response["ETag"] = etag
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ("Cookie",))
+    return response
+
+
+def _feed(request, scopes, queryset):
+    def build():
+        page = _page(
+            request, queryset.only(*POST_FIELDS), settings.NUMBER_POSTS
+        )
+        return _page_data(page, [_post_data(post) for post in page])
+
+    return _respond(request, scopes, build)
+
+
+@require_safe
+def index(request):
+    return _feed(request, ("index",), Post.objects.select_related("author"))
+
+
+@require_safe
+def group_posts(request, slug):
+    group = groups.get_by_slug(slug)
+    if group is None:
+        raise Http404
+    posts = Post.objects.filter(group_id=group.pk).select_related("author")
+    return _feed(request, (f"group:{group.pk}",), posts)
+
+
+@require_safe
+def profile(request, username):
+    try:
+        author_id = User.objects.values_list("pk", flat=True).get(
+            username=username
+        )
+    except User.DoesNotExist:
+        raise Http404
+    posts = Post.objects.filter(author_id=author_id).select_related("author")
+    return _feed(request, (f"author:{author_id}", "groups"), posts)
+
+
+@require_safe
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Нужна авторизация"}, status=401)
+    entries = (
+        TimelineEntry.objects.filter(user=request.user)
+        .select_related("post__author")
+        .only("pub_date", "post", *(f"post__{f}" for f in POST_FIELDS))
+    )
+
+    def build():
+        page = _page(
+            request,
+            entries,
+            settings.NUMBER_POSTS,
+            keys=("pub_date", "post_id"),
+        )
+        return _page_data(page, [_post_data(entry.post) for entry in page])
+
+    return _respond(request, ("index", f"follower:{request.user.pk}"), build)
+
+
+@require_safe
+def post_detail(request, post_id):
+    def build():
+        try:
+            post = (
+                Post.objects.select_related("author")
+                .only("comments_count", *POST_FIELDS)
+                .get(pk=post_id)
+            )
+        except Post.DoesNotExist:
+            raise Http404
+        comments = Comment.objects.filter(post_id=post_id).select_related(
+            "author"
+        )
+        page = _page(
+            request,
+            comments.only("text", "created", "author__username"),
+            settings.NUMBER_COMMENTS,
+            keys=("created", "id"),
+        )
+        return {
+            **_post_data(post),
+            "comments_count": post.comments_count,
+            "comments": _page_data(
+                page, [_comment_data(comment) for comment in page]
+            ),
+        }
+
+    return _respond(request, (f"post:{post_id}", "groups"), build)
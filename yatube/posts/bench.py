@@ -0,0 +1,81 @@
+"""Вспомогательные функции для нагрузочных замеров приложения posts.
+
+Все замеры выполняются внутри транзакции, которая откатывается в конце,
+поэтому сгенерированные данные не остаются в базе.
+"""
+import random
+import time
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from .models import Comment, Follow, Group, Post, User
+
+BATCH_SIZE = 1000
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """Выполняет блок в транзакции и всегда откатывает её."""
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def seed(users=100, groups=10, posts=10000, comments=20000, follows=1000):
+    """Наполняет базу случайными данными через bulk_create."""
+    rng = random.Random(0)
+    user_objs = User.objects.bulk_create(
+        User(username=f"bench_user_{i}") for i in range(users)
+    )
+    group_objs = Group.objects.bulk_create(
+        Group(title=f"Группа {i}", slug=f"bench-group-{i}", description="")
+        for i in range(groups)
+    )
+    post_objs = Post.objects.bulk_create(
+        (
+            Post(
+                text=f"Пост {i}",
+                author=rng.choice(user_objs),
+                group=rng.choice(group_objs + [None]),
+            )
+            for i in range(posts)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    Comment.objects.bulk_create(
+        (
+            Comment(
+                text=f"Комментарий {i}",
+                author=rng.choice(user_objs),
+                post=rng.choice(post_objs),
+            )
+            for i in range(comments)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    pairs = {
+        (rng.choice(user_objs), rng.choice(user_objs)) for _ in range(follows)
+    }
+    Follow.objects.bulk_create(
+        (Follow(user=user, author=author) for user, author in pairs),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    return user_objs, group_objs, post_objs
+
+
+def timeit(func, repeat=20):
+    """Возвращает среднее время выполнения func в миллисекундах."""
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
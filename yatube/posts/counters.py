@@ -0,0 +1,111 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарными UPDATE ... SET n = n + 1 из сигналов
+моделей, а repair_all пересчитывает их по исходным таблицам.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+USER_COUNTERS = {
+    "posts_count": (Post, "author"),
+    "followers_count": (Follow, "author"),
+    "following_count": (Follow, "user"),
+}
+
+
+def _count_subquery(model, field, outer="pk"):
+    counts = (
+        model.objects.filter(**{field: OuterRef(outer)})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def _shift(queryset, **deltas):
+    return queryset.update(
+        **{
+            field: Greatest(F(field) + delta, 0)
+            for field, delta in deltas.items()
+        }
+    )
+
+
+def _compute_user_counters(user_id):
+    return {
+        field: model.objects.filter(**{f"{lookup}_id": user_id}).count()
+        for field, (model, lookup) in USER_COUNTERS.items()
+    }
+
+
+def get_user_stats(user):
+    """Возвращает счётчики пользователя, создавая их при отсутствии."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        stats, _ = UserStats.objects.get_or_create(
+            user_id=user.pk, defaults=_compute_user_counters(user.pk)
+        )
+        return stats
+
+
+def shift_user(user_id, **deltas):
+    """Сдвигает счётчики пользователя на заданные величины.
+
+    Строка со счётчиками не создаётся: если её нет, get_user_stats
+    посчитает точные значения при первом чтении.
+    """
+    _shift(UserStats.objects.filter(user_id=user_id), **deltas)
+
+
+def shift_group(group_id, delta):
+    if group_id is not None:
+        _shift(Group.objects.filter(pk=group_id), posts_count=delta)
+
+
+def shift_post(post_id, delta):
+    _shift(Post.objects.filter(pk=post_id), comments_count=delta)
+
+
+def _user_counts():
+    return {
+        field: _count_subquery(model, lookup, outer="user_id")
+        for field, (model, lookup) in USER_COUNTERS.items()
+    }
+
+
+def repair(user_ids=(), group_ids=(), post_ids=()):
+    """Пересчитывает счётчики перечисленных строк.
+
+    id передаются списками или подзапросами (values() queryset), так
+    что на каждую таблицу уходит один UPDATE. Недостающие строки
+    UserStats не создаются, как и в shift_user.
+    """
+    UserStats.objects.filter(user_id__in=user_ids).update(**_user_counts())
+    Group.objects.filter(pk__in=group_ids).update(
+        posts_count=_count_subquery(Post, "group")
+    )
+    Post.objects.filter(pk__in=post_ids).update(
+        comments_count=_count_subquery(Comment, "post")
+    )
+
+
+def repair_all():
+    """Пересчитывает все счётчики пакетными UPDATE с подзапросами."""
+    existing = UserStats.objects.values("user_id")
+    UserStats.objects.bulk_create(
+        (
+            UserStats(user_id=user_id)
+            for user_id in User.objects.exclude(pk__in=existing)
+            .values_list("pk", flat=True)
+            .iterator()
+        ),
+        batch_size=1000,
+    )
+    UserStats.objects.update(**_user_counts())
+    Group.objects.update(posts_count=_count_subquery(Post, "group"))
+    Post.objects.update(comments_count=_count_subquery(Comment, "post"))
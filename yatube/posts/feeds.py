@@ -0,0 +1,150 @@
+"""Ленты RSS и Atom: весь сайт, группа и автор.
+
+В ленту попадают последние NUMBER_FEED_ITEMS постов, их выборка
+идёт по индексу (группа или автор, дата). Ответ несёт ETag из версий
+областей fragments и Last-Modified по самому новому посту, хранится
+в кеше страниц и устаревает вместе с HTML-страницей той же области.
+"""
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.http import parse_http_date_safe
+from django.utils.text import Truncator
+from django.views.decorators.http import require_safe
+
+from . import fragments, groups, pagecache
+from .models import Post, User
+from .scopes import group_scopes, index_scopes, profile_scopes
+
+
+class PostsFeed(Feed):
+    title = "Yatube"
+    description = "Последние посты на Yatube"
+
+    def link(self):
+        return reverse("posts:index")
+
+    def posts(self, obj):
+        return Post.objects.all()
+
+    def items(self, obj):
+        posts = self.posts(obj).select_related("author")
+        return groups.attach(
+            list(posts.order_by("-pub_date")[: settings.NUMBER_FEED_ITEMS])
+        )
+
+    def item_title(self, item):
+        return Truncator(item.text).words(8)
+
+    def item_description(self, item):
+        return item.text
+
+    def item_link(self, item):
+        return reverse("posts:post_detail", args=(item.pk,))
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+    def item_author_name(self, item):
+        return item.author.get_full_name() or item.author.username
+
+    def item_categories(self, item):
+        return (item.group.title,) if item.group else ()
+
+
+class GroupPostsFeed(PostsFeed):
+    def get_object(self, request, slug):
+        group = groups.get_by_slug(slug)
+        if group is None:
+            raise Http404
+        return group
+
+    def title(self, group):
+        return f"Yatube: {group.title}"
+
+    def description(self, group):
+        return group.description
+
+    def link(self, group):
+        return reverse("posts:group_list", args=(group.slug,))
+
+    def posts(self, group):
+        return Post.objects.filter(group_id=group.pk)
+
+
+class AuthorPostsFeed(PostsFeed):
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, author):
+        return f"Yatube: {author.get_full_name() or author.username}"
+
+    def description(self, author):
+        return f"Посты автора {author.username}"
+
+    def link(self, author):
+        return reverse("posts:profile", args=(author.username,))
+
+    def posts(self, author):
+        return Post.objects.filter(author_id=author.pk)
+
+
+class AtomPostsFeed(PostsFeed):
+    feed_type = Atom1Feed
+    subtitle = PostsFeed.description
+
+
+class AtomGroupPostsFeed(GroupPostsFeed):
+    feed_type = Atom1Feed
+    subtitle = GroupPostsFeed.description
+
+
+class AtomAuthorPostsFeed(AuthorPostsFeed):
+    feed_type = Atom1Feed
+    subtitle = AuthorPostsFeed.description
+
+
+def feed_view(feed, get_scopes):
+    """Представление ленты с 304 и кешем страниц.
+
+    get_scopes получает аргументы из URL и возвращает области, от
+    которых зависит лента. Совпавший If-None-Match получает 304 до
+    запросов за постами.
+    """
+
+    @pagecache.cache_anonymous_page(lambda *args, scopes, **kwargs: scopes)
+    def render(request, *args, scopes, **kwargs):
+        return feed(request, *args, **kwargs)
+
+    @require_safe
+    def view(request, *args, **kwargs):
+        scopes = get_scopes(*args, **kwargs)
+        etag = fragments.etag(scopes, request.path)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = render(request, *args, scopes=scopes, **kwargs)
+            last_modified = parse_http_date_safe(
+                response.get("Last-Modified", "")
+            )
+            response = get_conditional_response(
+                request,
+                etag=etag,
+                last_modified=last_modified,
+                response=response,
+            )
+        response["ETag"] = etag
+        return response
+
+    return view
+
+
+index_rss = feed_view(PostsFeed(), index_scopes)
+index_atom = feed_view(AtomPostsFeed(), index_scopes)
+group_rss = feed_view(GroupPostsFeed(), group_scopes)
+group_atom = feed_view(AtomGroupPostsFeed(), group_scopes)
+author_rss = feed_view(AuthorPostsFeed(), profile_scopes)
+author_atom = feed_view(AtomAuthorPostsFeed(), profile_scopes)
@@ -1,6 +1,46 @@
 from django import forms
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
 
+from . import groups
 from .models import Comment, Post
+from .uploads import normalize
+
+
+class GroupChoiceIterator(forms.models.ModelChoiceIterator):
+    """Варианты групп из кеша процесса, без запросов к базе."""
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for group in groups.all_groups():
+            yield self.choice(group)
+
+    def __len__(self):
+        return len(groups.all_groups()) + (
+            self.field.empty_label is not None
+        )
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(
+            groups.all_groups()
+        )
+
+
+class GroupChoiceField(forms.ModelChoiceField):
+    iterator = GroupChoiceIterator
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        group = groups.get(getattr(value, "pk", value))
+        if group is None:
+            raise ValidationError(
+                self.error_messages["invalid_choice"],
+                code="invalid_choice",
+                params={"value": value},
+            )
+        return group
 
 
 class PostForm(forms.ModelForm):
@@ -9,6 +49,13 @@ class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ("text", "group", "image")
+        field_classes = {"group": GroupChoiceField}
+
+    def clean_image(self):
+        image = self.cleaned_data.get("image")
+        if isinstance(image, UploadedFile):
+            return normalize(image)
+        return image
 
 
 class CommentForm(forms.ModelForm):
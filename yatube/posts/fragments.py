@@ -0,0 +1,57 @@
+"""Версии ключей для кеша фрагментов шаблонов.
+
+Фрагменты кешируются надолго вместе с версией области (лента,
+группа, автор, пост). Сигналы моделей увеличивают версию, и фрагмент
+с другой версией считается устаревшим.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = "fragment-version:{}"
+
+
+def _fresh_version():
+    # Версия из часов не совпадёт с версиями фрагментов, которые
+    # остались в кеше после вытеснения ключа версии.
+    return time.time_ns()
+
+
+def get_version(*scopes):
+    """Возвращает общую версию для набора областей."""
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = _fresh_version()
+            if not cache.add(key, version, timeout=None):
+                version = cache.get(key, version)
+            versions[key] = version
+    return "-".join(str(versions[key]) for key in keys)
+
+
+def bump(*scopes):
+    """Инвалидирует все фрагменты, зависящие от областей."""
+    for scope in scopes:
+        key = VERSION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_version(), timeout=None)
+
+
+def bump_on_commit(*scopes):
+    """Инвалидирует области после фиксации текущей транзакции.
+
+    До фиксации другие запросы ещё читают из базы старые строки и
+    сохранили бы их в кеш под новой версией.
+    """
+    transaction.on_commit(lambda: bump(*scopes))
+
+
+def etag(scopes, *parts):
+    """ETag ответа из частей его ключа и общей версии областей."""
+    key = "|".join((*map(str, parts), get_version(*scopes)))
+    return f'"{hashlib.blake2b(key.encode(), digest_size=16).hexdigest()}"'
@@ -0,0 +1,92 @@
+"""Кеш групп в памяти процесса.
+
+Групп мало и меняются они редко, поэтому каждый процесс держит всю
+таблицу в памяти. Сигналы Group сбрасывают кеш своего процесса и
+увеличивают версию области "groups" в общем кеше (fragments), а
+остальные процессы сверяют версию не чаще раза в
+GROUP_CACHE_CHECK_INTERVAL секунд и перечитывают таблицу, увидев
+новую.
+
+Объекты из кеша общие для всех запросов, менять их нельзя. Счётчик
+posts_count в них может отставать: он меняется без сигналов Group.
+"""
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from . import fragments
+from .models import Group, Post
+
+SCOPE = "groups"
+
+
+@dataclass
+class _Snapshot:
+    version: str
+    checked: float
+    ordered: list
+    by_pk: dict
+    by_slug: dict
+
+
+_snapshot = None
+
+
+def _current():
+    global _snapshot
+    snapshot = _snapshot
+    now = time.monotonic()
+    if snapshot and now - snapshot.checked < (
+        settings.GROUP_CACHE_CHECK_INTERVAL
+    ):
+        return snapshot
+    # Версия читается до таблицы: изменение, пришедшее между ними,
+    # даст новую версию и перечитывание при следующей проверке.
+    version = fragments.get_version(SCOPE)
+    if snapshot and snapshot.version == version:
+        snapshot.checked = now
+        return snapshot
+    groups = list(Group.objects.all())
+    snapshot = _Snapshot(
+        version=version,
+        checked=now,
+        ordered=groups,
+        by_pk={group.pk: group for group in groups},
+        by_slug={group.slug: group for group in groups},
+    )
+    _snapshot = snapshot
+    return snapshot
+
+
+def invalidate():
+    """Сбрасывает кеш процесса; вызывается из сигналов Group."""
+    global _snapshot
+    _snapshot = None
+
+
+def all_groups():
+    """Все группы в порядке Group.Meta.ordering."""
+    return _current().ordered
+
+
+def get(pk):
+    try:
+        return _current().by_pk.get(int(pk))
+    except (TypeError, ValueError):
+        return None
+
+
+def get_by_slug(slug):
+    return _current().by_slug.get(slug)
+
+
+def attach(posts):
+    """Подставляет постам группы из кеша вместо JOIN или запроса."""
+    group_field = Post._meta.get_field("group")
+    for post in posts:
+        if post.group_id is not None:
+            group = get(post.group_id)
+            if group is not None:
+                group_field.set_cached_value(post, group)
+    return posts
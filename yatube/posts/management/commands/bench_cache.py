@@ -0,0 +1,80 @@
+import multiprocessing
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+
+def _build_cache(preset):
+    params = dict(preset)
+    backend = import_string(params.pop("BACKEND"))
+    return backend(params.pop("LOCATION", ""), params)
+
+
+def _worker(preset, requests, keys, render_ms, seed):
+    """Имитирует воркер: читает страницу из кеша или «рендерит» её."""
+    cache = _build_cache(preset)
+    rng = random.Random(seed)
+    hits = 0
+    start = time.perf_counter()
+    for _ in range(requests):
+        # Популярные страницы запрашиваются чаще остальных.
+        key = f"bench-page:{int(rng.paretovariate(1.2)) % keys}"
+        if cache.get(key) is not None:
+            hits += 1
+            continue
+        time.sleep(render_ms / 1000)
+        cache.set(key, "x" * 20000, 300)
+    return hits, time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает долю попаданий и задержку кеша страниц для "
+        "нескольких бэкендов и разного числа воркеров."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--backends",
+            default="locmem,file",
+            help="Пресеты из settings.CACHE_PRESETS через запятую.",
+        )
+        parser.add_argument("--workers", default="1,2,4,8")
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--keys", type=int, default=200)
+        parser.add_argument("--render-ms", type=float, default=2.0)
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context("fork")
+        for name in options["backends"].split(","):
+            if name not in settings.CACHE_PRESETS:
+                raise CommandError(f"Неизвестный бэкенд кеша: {name}")
+            preset = settings.CACHE_PRESETS[name]
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for workers in map(int, options["workers"].split(",")):
+                _build_cache(preset).clear()
+                per_worker = options["requests"] // workers
+                with context.Pool(workers) as pool:
+                    results = pool.starmap(
+                        _worker,
+                        [
+                            (
+                                preset,
+                                per_worker,
+                                options["keys"],
+                                options["render_ms"],
+                                seed,
+                            )
+                            for seed in range(workers)
+                        ],
+                    )
+                hits = sum(hit for hit, _ in results)
+                elapsed = sum(seconds for _, seconds in results)
+                total = per_worker * workers
+                self.stdout.write(
+                    f"  workers={workers}: hit rate {hits / total:.1%}, "
+                    f"{elapsed / total * 1000:.3f} ms/request"
+                )
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from posts import variants
+from posts.models import Post
+
+# Ширина окна в CSS-пикселях и плотность пикселей экрана.
+DEVICES = {
+    "phone 1x": (360, 1),
+    "phone 2x": (360, 2),
+    "desktop": (1280, 1),
+}
+# Качество JPEG, с которым sorl строит миниатюру 960x339 по умолчанию.
+SORL_QUALITY = 95
+
+
+def _pick_width(css_width, dpr):
+    """Ширина из srcset, которую выберет браузер при sizes из шаблона."""
+    needed = min(css_width, 960) * dpr
+    for width in variants.WIDTHS:
+        if width >= needed:
+            return width
+    return variants.WIDTHS[-1]
+
+
+def _sample_images(count):
+    for seed in range(count):
+        noise = Image.effect_noise((1600, 1200), 40 + seed).convert("RGB")
+        gradient = Image.linear_gradient("L").resize((1600, 1200))
+        yield Image.merge("RGB", (gradient, noise.getchannel(0), gradient))
+
+
+class Command(BaseCommand):
+    help = (
+        "Оценивает объём картинок на странице ленты с одной миниатюрой "
+        "JPEG и с адаптивными вариантами WebP."
+    )
+
+    def _page_images(self):
+        names = list(
+            Post.objects.exclude(image="").values_list("image", flat=True)[
+                : settings.NUMBER_POSTS
+            ]
+        )
+        for name in names:
+            with default_storage.open(name) as source:
+                image = Image.open(source)
+                image.load()
+            yield image.convert("RGB")
+        if not names:
+            self.stdout.write("Картинок в базе нет, беру синтетические.")
+            yield from _sample_images(settings.NUMBER_POSTS)
+
+    def handle(self, *args, **options):
+        before = 0
+        after = dict.fromkeys(DEVICES, 0)
+        for image in self._page_images():
+            before += len(variants.encode(image, 960, "jpeg", SORL_QUALITY))
+            for device, (css_width, dpr) in DEVICES.items():
+                width = _pick_width(css_width, dpr)
+                after[device] += len(variants.encode(image, width, "webp"))
+        self.stdout.write(f"JPEG 960x339: {before / 1024:.1f} KiB/страница")
+        for device, size in after.items():
+            self.stdout.write(
+                f"WebP srcset, {device}: {size / 1024:.1f} KiB/страница "
+                f"({size / before:.0%})"
+            )
@@ -0,0 +1,54 @@
+import multiprocessing
+import resource
+import tempfile
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from posts import uploads
+
+
+def _naive(path):
+    """Прежнее поведение: картинка декодируется целиком."""
+    with Image.open(path) as image:
+        image.load()
+        image.thumbnail((960, 960))
+
+
+def _bounded(path):
+    with open(path, "rb") as source:
+        uploads.normalize(File(source, name="large.jpg")).close()
+
+
+def _peak_rss_growth(func, path):
+    """Прирост пикового RSS процесса при вызове func, в МиБ."""
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    func(path)
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return (after - before) / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Измеряет пиковый RSS при приёме большой JPEG-картинки "
+        "с полным декодированием и с ограниченным."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--megapixels", type=int, default=40)
+
+    def handle(self, *args, **options):
+        side = int((options["megapixels"] * 10**6 * 3 / 2) ** 0.5)
+        size = (side, side * 2 // 3)
+        context = multiprocessing.get_context("fork")
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as source:
+            Image.linear_gradient("L").resize(size).convert("RGB").save(
+                source, "JPEG", quality=90
+            )
+            self.stdout.write(f"Картинка {size[0]}×{size[1]}")
+            for label, func in (("naive", _naive), ("bounded", _bounded)):
+                # Каждый замер в свежем процессе, чтобы пики не смешивались.
+                with context.Pool(1) as pool:
+                    growth = pool.apply(_peak_rss_growth, (func, source.name))
+                self.stdout.write(f"  {label}: +{growth:.1f} МиБ RSS")
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from posts import bench
+from posts.models import Comment, Follow, Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает планы и время горячих запросов без составных "
+        "индексов и с ними на сгенерированных данных."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=50000)
+        parser.add_argument("--comments", type=int, default=100000)
+        parser.add_argument("--repeat", type=int, default=50)
+
+    def _queries(self, users, groups, posts):
+        author, group, post = users[0], groups[0], posts[0]
+        per_page = settings.NUMBER_POSTS
+        return {
+            "profile feed": Post.objects.filter(author=author).order_by(
+                "-pub_date"
+            )[:per_page],
+            "group feed": Post.objects.filter(group=group).order_by(
+                "-pub_date"
+            )[:per_page],
+            "post comments": Comment.objects.filter(post=post).order_by(
+                "-created"
+            ),
+            "follow lookup": Follow.objects.filter(
+                user=users[1], author=author
+            ),
+        }
+
+    def _measure(self, label, queries, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        for name, queryset in queries.items():
+            elapsed = bench.timeit(lambda: list(queryset.all()), repeat)
+            self.stdout.write(f"  {name}: {elapsed:.3f} ms")
+            for line in queryset.explain().splitlines():
+                self.stdout.write(f"    {line}")
+
+    def _toggle_indexes(self, add):
+        # Уникальное ограничение Follow в SQLite входит в DDL таблицы,
+        # поэтому переключаются только индексы Post и Comment.
+        editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for model in (Post, Comment):
+                for index in model._meta.indexes:
+                    if add:
+                        sql = index.create_sql(model, editor)
+                    else:
+                        sql = index.remove_sql(model, editor)
+                    cursor.execute(str(sql))
+
+    def handle(self, *args, **options):
+        with bench.rolled_back():
+            users, groups, posts = bench.seed(
+                posts=options["posts"], comments=options["comments"]
+            )
+            queries = self._queries(users, groups, posts)
+            self._toggle_indexes(add=False)
+            self._measure("Без индексов", queries, options["repeat"])
+            self._toggle_indexes(add=True)
+            self._measure("С индексами", queries, options["repeat"])
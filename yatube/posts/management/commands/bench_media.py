@@ -0,0 +1,91 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from django.views import static
+
+from core import media
+from posts import bench
+
+NAME = "posts/bench.jpg"
+
+
+def _consume(response):
+    """Читает ответ целиком, как WSGI-сервер, и возвращает число байт."""
+    if response.streaming:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        size = len(response.content)
+    response.close()
+    return size
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает отдачу медиафайла через django.views.static.serve "
+        "и через core.media.serve: полный файл, повторный запрос, "
+        "Range и отдачу веб-сервером."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=8, help="МиБ")
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def _scenarios(self, root, validators):
+        factory = RequestFactory()
+        url = "/media/" + NAME
+
+        def static_serve(**headers):
+            return static.serve(
+                factory.get(url, **headers), NAME, document_root=root
+            )
+
+        def media_serve(**headers):
+            return media.serve(factory.get(url, **headers), NAME)
+
+        range_header = {"HTTP_RANGE": "bytes=0-65535"}
+        return {
+            "полный файл": (static_serve, media_serve, {}, {}),
+            "повторный запрос": (
+                static_serve,
+                media_serve,
+                {"HTTP_IF_MODIFIED_SINCE": validators["Last-Modified"]},
+                {"HTTP_IF_NONE_MATCH": validators["ETag"]},
+            ),
+            "Range 64 КиБ": (
+                static_serve,
+                media_serve,
+                range_header,
+                range_header,
+            ),
+        }
+
+    def _row(self, label, view, headers, repeat):
+        sent = _consume(view(**headers))
+        elapsed = bench.timeit(lambda: _consume(view(**headers)), repeat)
+        self.stdout.write(
+            f"  {label:<10} {elapsed:8.2f} мс, {sent / 1024:10.1f} КиБ"
+        )
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+        with tempfile.TemporaryDirectory() as root, override_settings(
+            MEDIA_ROOT=root, MEDIA_ACCEL=""
+        ):
+            os.makedirs(os.path.join(root, "posts"))
+            with open(os.path.join(root, NAME), "wb") as file:
+                file.write(os.urandom(options["size"] * 2**20))
+            factory = RequestFactory()
+            validators = media.serve(factory.get("/"), NAME)
+            validators.close()
+            scenarios = self._scenarios(root, validators)
+            for name, (old, new, old_headers, new_headers) in (
+                scenarios.items()
+            ):
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                self._row("static", old, old_headers, repeat)
+                self._row("media", new, new_headers, repeat)
+            self.stdout.write(self.style.MIGRATE_HEADING("X-Accel-Redirect"))
+            with override_settings(MEDIA_ACCEL="nginx"):
+                self._row("media", scenarios["полный файл"][1], {}, repeat)
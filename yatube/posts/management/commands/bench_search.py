@@ -0,0 +1,85 @@
+import random
+from itertools import accumulate
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from posts import bench, search
+from posts.models import Post, User
+
+BATCH_SIZE = 5000
+VOCABULARY = 20000
+WORDS_PER_POST = 30
+
+
+def _vocabulary(rng):
+    letters = "абвгдежзиклмнопрстуфхцчшэюя"
+    return [
+        "".join(rng.choices(letters, k=rng.randint(3, 10)))
+        for _ in range(VOCABULARY)
+    ]
+
+
+def _search_like(query, per_page):
+    """Поиск, который был до индекса: все слова через LIKE '%...%'."""
+    condition = Q()
+    for word in query.split():
+        condition &= Q(text__icontains=word)
+    return list(Post.objects.filter(condition).order_by("-id")[:per_page])
+
+
+def _texts(rng, words, count):
+    # Частоты слов убывают как в естественном языке (закон Ципфа).
+    weights = list(accumulate(1 / rank for rank in range(1, len(words) + 1)))
+    for _ in range(count):
+        yield " ".join(
+            rng.choices(words, cum_weights=weights, k=WORDS_PER_POST)
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает поиск по постам через LIKE '%...%' и через "
+        "индекс FTS5 на сгенерированных данных."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=1_000_000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def _queries(self, words):
+        return {
+            "частое слово": words[0],
+            "среднее слово": words[200],
+            "редкое слово": words[-1],
+            "два слова": f"{words[10]} {words[300]}",
+            "нет в текстах": "отсутствующее",
+        }
+
+    def handle(self, *args, **options):
+        if not search.enabled():
+            raise CommandError("Полнотекстовый индекс есть только в SQLite")
+        rng = random.Random(0)
+        words = _vocabulary(rng)
+        per_page = settings.NUMBER_POSTS
+        with bench.rolled_back():
+            author = User.objects.create(username="bench_search")
+            texts = _texts(rng, words, options["posts"])
+            Post.objects.bulk_create(
+                (Post(text=text, author=author) for text in texts),
+                batch_size=BATCH_SIZE,
+            )
+            search.rebuild()
+            for name, query in self._queries(words).items():
+                like = bench.timeit(
+                    lambda: _search_like(query, per_page),
+                    options["repeat"],
+                )
+                fts = bench.timeit(
+                    lambda: search.search(query, per_page),
+                    options["repeat"],
+                )
+                self.stdout.write(
+                    f"{name:<14} LIKE {like:9.1f} мс, FTS5 {fts:7.1f} мс"
+                )
@@ -0,0 +1,169 @@
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from sorl.thumbnail.conf import settings as thumbnail_settings
+
+from posts import media, thumbnails
+from posts.models import ImageVariant, Post
+
+
+def referenced_by(model, field):
+    def referenced(names):
+        return set(
+            model.objects.filter(**{f"{field}__in": names}).values_list(
+                field, flat=True
+            )
+        )
+
+    return referenced
+
+
+# Каталоги хранилища и функции, которые из пачки имён возвращают те,
+# на которые есть ссылки.
+ROOTS = {
+    "posts": referenced_by(Post, "image"),
+    "variants": referenced_by(ImageVariant, "file"),
+    thumbnail_settings.THUMBNAIL_PREFIX.strip("/"): thumbnails.known,
+}
+
+
+def walk(root, directory, after=""):
+    """Лениво обходит файлы каталога в порядке строк их путей.
+
+    В памяти держится только содержимое текущих каталогов: все
+    корни разбиты на подкаталоги по хешу имени, поэтому каталог не
+    растёт вместе с хранилищем. Сортировка нужна для продолжения с
+    after. Выдаёт (путь от root, stat), пропуская всё, что не больше
+    after.
+    """
+    path = os.path.join(root, directory)
+    try:
+        entries = list(os.scandir(path))
+    except FileNotFoundError:
+        return
+    # Каталог сортируется как "имя/", чтобы порядок совпадал с
+    # порядком полных путей ("ab.jpg" < "ab/...").
+    entries.sort(key=lambda e: e.name + "/" if e.is_dir() else e.name)
+    for entry in entries:
+        name = f"{directory}/{entry.name}"
+        if entry.is_dir(follow_symlinks=False):
+            if after < name + "/" or after.startswith(name + "/"):
+                yield from walk(root, name, after)
+        elif entry.is_file(follow_symlinks=False) and name > after:
+            yield name, entry.stat()
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        "Находит файлы картинок, вариантов и миниатюр, на которые не "
+        "ссылается ни одна запись, и при --delete удаляет их."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--delete", action="store_true", help="Удалять найденное."
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--min-age",
+            type=float,
+            default=1,
+            help="Не трогать файлы моложе стольких часов.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="Файл, в котором хранится последний проверенный путь.",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            help="Проверить не больше стольких файлов за запуск.",
+        )
+
+    def _read_checkpoint(self, path):
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                return file.read().strip()
+        return ""
+
+    def _write_checkpoint(self, path, value):
+        if not path:
+            return
+        if value is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+            file.write(value)
+        os.replace(f"{path}.tmp", path)
+
+    def _files(self, storage, after):
+        for directory in sorted(ROOTS):
+            if after < directory + "/" or after.startswith(directory + "/"):
+                yield from walk(storage.location, directory, after)
+
+    def _orphans(self, chunk, deadline):
+        """Файлы пачки без ссылок, проверенные одним запросом на каждый
+        каталог."""
+        names = {name for name, _ in chunk}
+        for directory, referenced in ROOTS.items():
+            candidates = [
+                name for name in names if name.startswith(directory + "/")
+            ]
+            if candidates:
+                names -= referenced(candidates)
+        return [
+            (name, stat)
+            for name, stat in chunk
+            if name in names and stat.st_mtime < deadline
+        ]
+
+    def _delete(self, storage, orphans, min_age):
+        for name, _ in orphans:
+            if name.startswith("posts/"):
+                # Ссылки перепроверяются под блокировкой счётчика: пост
+                # мог появиться после проверки пачки.
+                media.collect(name, min_age)
+            else:
+                storage.delete(name)
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field("image").storage
+        after = self._read_checkpoint(options["checkpoint"])
+        deadline = time.time() - options["min_age"] * 3600
+        files = self._files(storage, after)
+        if options["limit"]:
+            files = islice(files, options["limit"])
+        checked = found = size = 0
+        last = None
+        for chunk in chunks(files, options["chunk_size"]):
+            orphans = self._orphans(chunk, deadline)
+            for name, stat in orphans:
+                self.stdout.write(name)
+                size += stat.st_size
+            if options["delete"]:
+                self._delete(storage, orphans, options["min_age"] * 3600)
+            checked += len(chunk)
+            found += len(orphans)
+            last = chunk[-1][0]
+            self._write_checkpoint(options["checkpoint"], last)
+        finished = not options["limit"] or checked < options["limit"]
+        self._write_checkpoint(
+            options["checkpoint"], None if finished else last
+        )
+        action = "удалено" if options["delete"] else "найдено"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Проверено файлов: {checked}, {action} лишних: {found} "
+                f"({size / 2**20:.1f} МиБ)"
+                + ("" if finished else f", продолжение после {last}")
+            )
+        )
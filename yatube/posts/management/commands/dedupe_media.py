@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand
+
+from posts import media, thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Переименовывает картинки постов по хешу содержимого, "
+        "объединяет дубликаты и удаляет лишние копии с миниатюрами."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только посчитать, сколько места освободится.",
+        )
+
+    def _rename(self, storage, names, dry_run):
+        """Копирует файлы под имена по хешу, возвращает {старое: новое}
+        и число дубликатов с освобождаемым объёмом."""
+        targets = {}
+        seen = set()
+        duplicates = freed = 0
+        for name in names:
+            if not storage.exists(name):
+                self.stderr.write(f"{name}: файла нет")
+                continue
+            with storage.open(name) as content:
+                target = storage.hashed_name(name, content)
+                if target == name:
+                    continue
+                if target in seen or storage.exists(target):
+                    duplicates += 1
+                    freed += storage.size(name)
+                elif not dry_run:
+                    storage.save(name, content)
+            targets[name] = target
+            seen.add(target)
+        return targets, duplicates, freed
+
+    def _relink(self, targets):
+        for name, target in targets.items():
+            Post.objects.filter(image=name).update(image=target)
+        for name in media.repair_all():
+            media.collect(name)
+        for target in sorted(set(targets.values())):
+            try:
+                thumbnails.generate(target)
+            except Exception as error:
+                self.stderr.write(f"{target}: {error}")
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field("image").storage
+        names = list(
+            Post.objects.exclude(image="")
+            .order_by("image")
+            .values_list("image", flat=True)
+            .distinct()
+        )
+        targets, duplicates, freed = self._rename(
+            storage, names, options["dry_run"]
+        )
+        if not options["dry_run"]:
+            self._relink(targets)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Картинок: {len(names)}, переименовано: {len(targets)}, "
+                f"дубликатов: {duplicates}, "
+                f"освобождено: {freed / 2**20:.1f} МиБ"
+            )
+        )
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = "Строит миниатюры для картинок существующих постов."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Перестроить варианты, даже если они уже есть.",
+        )
+
+    def handle(self, *args, **options):
+        names = (
+            Post.objects.exclude(image="")
+            .order_by("image")
+            .values_list("image", flat=True)
+            .distinct()
+        )
+        done = failed = 0
+        for name in names.iterator():
+            try:
+                thumbnails.generate(name, force=options["force"])
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f"{name}: {error}")
+            else:
+                done += 1
+        self.stdout.write(
+            self.style.SUCCESS(f"Готово: {done}, с ошибками: {failed}")
+        )
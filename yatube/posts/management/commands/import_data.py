@@ -0,0 +1,346 @@
+import gzip
+import json
+import os
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import (
+    counters,
+    fragments,
+    groups,
+    media,
+    search,
+    sitemaps,
+    timeline,
+)
+from posts.models import Comment, Follow, Group, ImportedRow, Post, User
+
+# Порядок важен: посты ссылаются на группы, комментарии — на посты.
+TABLES = ("groups", "posts", "comments", "follows")
+
+
+@contextmanager
+def original_dates(*fields):
+    """Отключает auto_now_add, чтобы bulk_create сохранил даты из
+    файла, а не время импорта."""
+    saved = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in zip(fields, saved):
+            field.auto_now_add = value
+
+
+def _open(directory, table):
+    for name in (f"{table}.jsonl", f"{table}.jsonl.gz"):
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            opener = gzip.open if name.endswith(".gz") else open
+            return opener(path, "rt", encoding="utf-8")
+    return None
+
+
+def _batches(file, size):
+    rows = (json.loads(line) for line in file if line.strip())
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def _date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise CommandError(f"Не разобрать дату: {value}")
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def _unique(rows, key):
+    """Оставляет первую строку для каждого значения key."""
+    seen = set()
+    result = []
+    for row in rows:
+        value = str(row[key])
+        if value not in seen:
+            seen.add(value)
+            result.append(row)
+    return result
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает группы, посты, комментарии и подписки из JSONL "
+        "пачками через bulk_create с исходными датами, а потом "
+        "пакетными запросами обновляет счётчики, ленты и поисковый "
+        "индекс загруженного. Посты и комментарии без id "
+        "отклоняются, загруженные раньше пропускаются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "directory",
+            help=(
+                "Каталог с groups.jsonl, posts.jsonl, comments.jsonl и "
+                "follows.jsonl (можно .jsonl.gz). Авторы указываются "
+                "по username, группы по slug, пост комментария — по id "
+                "поста в файле."
+            ),
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def _user_ids(self, usernames):
+        """id пользователей пачки по именам; недостающие создаются без
+        пароля."""
+        usernames = set(usernames)
+        users = dict(
+            User.objects.filter(username__in=usernames).values_list(
+                "username", "pk"
+            )
+        )
+        password = make_password(None)
+        created = User.objects.bulk_create(
+            User(username=name, password=password)
+            for name in usernames - users.keys()
+        )
+        users.update((user.username, user.pk) for user in created)
+        return users
+
+    def _imported(self, table, source_ids):
+        """{id в файле: id в базе} для строк пачки, загруженных
+        раньше."""
+        return dict(
+            ImportedRow.objects.filter(
+                table=table, source_id__in={str(pk) for pk in source_ids}
+            ).values_list("source_id", "object_id")
+        )
+
+    def _new_rows(self, table, rows):
+        """Строки пачки с id, которых ещё нет в базе."""
+        with_id = [row for row in rows if row.get("id") is not None]
+        self.rejected[table] += len(rows) - len(with_id)
+        rows = _unique(with_id, "id")
+        known = self._imported(table, (row["id"] for row in rows))
+        return [row for row in rows if str(row["id"]) not in known]
+
+    def _remember(self, table, source_ids, objects):
+        ImportedRow.objects.bulk_create(
+            ImportedRow(table=table, source_id=str(pk), object_id=obj.pk)
+            for pk, obj in zip(source_ids, objects)
+        )
+
+    def _groups(self, rows):
+        rows = _unique(rows, "slug")
+        slugs = [row["slug"] for row in rows]
+        existing = set(
+            Group.objects.filter(slug__in=slugs).values_list(
+                "slug", flat=True
+            )
+        )
+        Group.objects.bulk_create(
+            Group(
+                slug=row["slug"],
+                title=row.get("title") or row["slug"],
+                description=row.get("description", ""),
+            )
+            for row in rows
+            if row["slug"] not in existing
+        )
+        return len(rows) - len(existing)
+
+    def _group_ids(self, slugs):
+        """id групп по slug; неизвестная группа даёт пост без группы."""
+        missing = set(slugs) - self.groups.keys() - {None}
+        if missing:
+            self.groups.update(
+                Group.objects.filter(slug__in=missing).values_list(
+                    "slug", "pk"
+                )
+            )
+        return self.groups
+
+    def _posts(self, rows):
+        rows = self._new_rows("posts", rows)
+        users = self._user_ids(row["author"] for row in rows)
+        group_ids = self._group_ids(row.get("group") for row in rows)
+        posts = Post.objects.bulk_create(
+            Post(
+                text=row["text"],
+                pub_date=_date(row.get("pub_date")),
+                author_id=users[row["author"]],
+                group_id=group_ids.get(row.get("group")),
+                image=row.get("image") or "",
+            )
+            for row in rows
+        )
+        self._remember("posts", (row["id"] for row in rows), posts)
+        return len(posts)
+
+    def _comments(self, rows):
+        rows = self._new_rows("comments", rows)
+        posts = self._imported("posts", (row["post"] for row in rows))
+        rows = [row for row in rows if str(row["post"]) in posts]
+        users = self._user_ids(row["author"] for row in rows)
+        comments = Comment.objects.bulk_create(
+            Comment(
+                post_id=posts[str(row["post"])],
+                author_id=users[row["author"]],
+                text=row["text"],
+                created=_date(row.get("created")),
+            )
+            for row in rows
+        )
+        self._remember("comments", (row["id"] for row in rows), comments)
+        return len(comments)
+
+    def _follows(self, rows):
+        users = self._user_ids(
+            name for row in rows for name in (row["user"], row["author"])
+        )
+        pairs = {
+            (users[row["user"]], users[row["author"]])
+            for row in rows
+            if row["user"] != row["author"]
+        }
+        existing = set(
+            Follow.objects.filter(
+                user_id__in={user_id for user_id, _ in pairs},
+                author_id__in={author_id for _, author_id in pairs},
+            ).values_list("user_id", "author_id")
+        )
+        pairs = sorted(pairs - existing)
+        follows = Follow.objects.bulk_create(
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in pairs
+        )
+        # Подписка определяется парой, id в файле ей не нужен.
+        self._remember(
+            "follows", (f"{user}:{author}" for user, author in pairs), follows
+        )
+        return len(follows)
+
+    def _import(self, table, file, batch_size):
+        load = getattr(self, f"_{table}")
+        started = time.perf_counter()
+        read = loaded = 0
+        for rows in _batches(file, batch_size):
+            with transaction.atomic():
+                loaded += load(rows)
+            read += len(rows)
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        rejected = self.rejected[table]
+        self.stdout.write(
+            f"{table:<9} {read:>10} строк, загружено {loaded:>10} "
+            f"{elapsed:7.2f} с {read / elapsed:10.0f} строк/с"
+            + (f", отклонено без id: {rejected}" if rejected else "")
+        )
+
+    def _maintain_rows(self, rows):
+        """Обновляет производные данные для загруженных строк rows
+        (queryset ImportedRow): несколько пакетных запросов на пачку
+        независимо от её размера."""
+        posts = rows.filter(table="posts").values("object_id")
+        comments = rows.filter(table="comments").values("object_id")
+        follows = rows.filter(table="follows").values("object_id")
+        new_posts = Post.objects.filter(pk__in=posts)
+        new_follows = Follow.objects.filter(pk__in=follows)
+        timeline.fill(follows, posts)
+        for user_ids in (
+            new_posts.values("author_id"),
+            new_follows.values("user_id"),
+            new_follows.values("author_id"),
+        ):
+            counters.repair(user_ids=user_ids)
+        counters.repair(
+            group_ids=new_posts.values("group_id"),
+            post_ids=Comment.objects.filter(pk__in=comments).values(
+                "post_id"
+            ),
+        )
+        media.repair(posts)
+        search.index_posts(posts)
+        search.index_comments(comments)
+        rows.update(maintained=True)
+
+    def _scopes(self, rows):
+        """Области кеша, которые показывают строки rows."""
+        scopes = set()
+        posts = Post.objects.filter(
+            pk__in=rows.filter(table="posts").values("object_id")
+        ).only("author_id", "group_id")
+        for post in posts.iterator():
+            scopes.update(sitemaps.post_scopes(post))
+            scopes.add(f"author:{post.author_id}")
+            if post.group_id:
+                scopes.add(f"group:{post.group_id}")
+        comments = Comment.objects.filter(
+            pk__in=rows.filter(table="comments").values("object_id")
+        ).values_list("post_id", flat=True)
+        scopes.update(f"post:{post_id}" for post_id in comments.iterator())
+        follows = Follow.objects.filter(
+            pk__in=rows.filter(table="follows").values("object_id")
+        ).values_list("user_id", "author_id")
+        for user_id, author_id in follows.iterator():
+            scopes.update((f"follower:{user_id}", f"followers:{author_id}"))
+        return scopes
+
+    def _maintain(self, chunk_size):
+        """Обновляет счётчики, ленты, ссылки на картинки и индекс для
+        всех необработанных строк, в том числе оставшихся от
+        прерванного запуска.
+
+        Строки обрабатываются диапазонами id по chunk_size, каждый в
+        своей транзакции; области кеша сбрасываются после её фиксации.
+        """
+        started = time.perf_counter()
+        pending = ImportedRow.objects.filter(maintained=False).order_by("pk")
+        last = 0
+        while ids := list(
+            pending.filter(pk__gt=last).values_list("pk", flat=True)[
+                :chunk_size
+            ]
+        ):
+            rows = pending.filter(pk__gt=last, pk__lte=ids[-1])
+            last = ids[-1]
+            with transaction.atomic():
+                self._maintain_rows(rows)
+            fragments.bump(
+                *self._scopes(ImportedRow.objects.filter(pk__in=ids))
+            )
+        groups.invalidate()
+        fragments.bump("index", "groups", *sitemaps.GROUP_SCOPES)
+        self.stdout.write(
+            f"Счётчики, ленты и индекс: "
+            f"{time.perf_counter() - started:.2f} с"
+        )
+
+    def handle(self, *args, **options):
+        self.groups = {}
+        self.rejected = {table: 0 for table in TABLES}
+        started = time.perf_counter()
+        with original_dates(
+            Post._meta.get_field("pub_date"),
+            Comment._meta.get_field("created"),
+        ):
+            for table in TABLES:
+                file = _open(options["directory"], table)
+                if file is None:
+                    continue
+                with file:
+                    self._import(table, file, options["batch_size"])
+        self._maintain(options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Импорт занял {time.perf_counter() - started:.2f} с"
+            )
+        )
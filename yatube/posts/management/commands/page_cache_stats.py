@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from core import singleflight
+from posts import pagecache
+
+
+class Command(BaseCommand):
+    help = (
+        "Показывает статистику кеша страниц для анонимных посетителей "
+        "и пересчётов устаревших записей."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Обнулить счётчики."
+        )
+
+    def handle(self, *args, **options):
+        stats = pagecache.stats()
+        requests = stats["hits"] + stats["misses"]
+        ratio = stats["hits"] / requests if requests else 0
+        for name, value in stats.items():
+            self.stdout.write(f"{name}: {value}")
+        self.stdout.write(f"hit ratio: {ratio:.1%}")
+        for name, value in singleflight.stats().items():
+            self.stdout.write(f"{name}: {value}")
+        if options["reset"]:
+            pagecache.reset_stats()
+            singleflight.reset_stats()
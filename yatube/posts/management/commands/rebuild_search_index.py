@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import search
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = "Строит полнотекстовый индекс постов и комментариев заново."
+
+    def handle(self, *args, **options):
+        if not search.enabled():
+            raise CommandError("Полнотекстовый индекс есть только в SQLite")
+        with transaction.atomic():
+            search.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Индекс построен, постов: {Post.objects.count()}"
+            )
+        )
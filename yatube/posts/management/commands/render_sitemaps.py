@@ -0,0 +1,62 @@
+import os
+import re
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.urls import reverse
+
+from posts import sitemaps
+
+# Устаревшими считаются только части карты, остальные файлы каталога
+# не трогаются.
+SHARD_NAME = re.compile(
+    rf"sitemap-({'|'.join(map(re.escape, sitemaps.SITEMAPS))})-\d+\.xml"
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Сохраняет карту сайта в статические файлы с теми же именами, "
+        "что и у /sitemap.xml и его частей."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="Каталог для файлов.")
+        parser.add_argument(
+            "--base-url",
+            required=True,
+            help="Адрес сайта, например https://yatube.ru",
+        )
+
+    def _write(self, directory, url, content):
+        path = os.path.join(directory, url.lstrip("/"))
+        with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+            file.write(content)
+        os.replace(f"{path}.tmp", path)
+        return os.path.basename(path)
+
+    def handle(self, *args, **options):
+        base = urlsplit(options["base_url"])
+        if base.scheme not in ("http", "https") or not base.netloc:
+            raise CommandError("Нужен адрес вида https://example.com")
+        request = RequestFactory().get(
+            "/", HTTP_HOST=base.netloc, secure=base.scheme == "https"
+        )
+        directory = options["directory"]
+        os.makedirs(directory, exist_ok=True)
+        written = set()
+        for section, page in sitemaps.shards():
+            url = reverse("sitemap_section", args=(section, page))
+            content = sitemaps.render_section(request, section, page)
+            written.add(self._write(directory, url, content))
+        # Индекс пишется последним, чтобы не ссылаться на ещё не
+        # записанные части.
+        index = sitemaps.render_index(request)
+        written.add(self._write(directory, reverse("sitemap"), index))
+        for name in os.listdir(directory):
+            if SHARD_NAME.fullmatch(name) and name not in written:
+                os.remove(os.path.join(directory, name))
+        self.stdout.write(
+            self.style.SUCCESS(f"Записано файлов: {len(written)}")
+        )
@@ -0,0 +1,135 @@
+"""Счётчики ссылок на файлы картинок постов.
+
+Одинаковые картинки хранятся одним файлом (posts.storage), поэтому
+удалять файл вместе с постом нельзя. Сигналы постов сдвигают счётчик
+в MediaFile, а файл, миниатюры и варианты удаляются после коммита,
+когда ссылок не осталось.
+"""
+import os
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from sorl.thumbnail import delete as delete_thumbnails
+
+from . import thumbnails, variants
+from .models import MediaFile, Post
+
+
+def _shift(name, delta):
+    updated = MediaFile.objects.filter(name=name).update(
+        refs=Greatest(F("refs") + delta, 0)
+    )
+    if not updated:
+        # Файл загружен до появления счётчиков: считаем ссылки заново.
+        MediaFile.objects.get_or_create(
+            name=name,
+            defaults={"refs": Post.objects.filter(image=name).count()},
+        )
+
+
+def acquire(name):
+    """Учитывает новую ссылку поста на файл."""
+    if name:
+        _shift(name, 1)
+
+
+def release(name):
+    """Снимает ссылку на файл и удаляет его после коммита, если
+    ссылок не осталось."""
+    if name:
+        _shift(name, -1)
+        transaction.on_commit(lambda: collect(name))
+
+
+def _is_recent(name, min_age):
+    storage = Post._meta.get_field("image").storage
+    try:
+        modified = os.path.getmtime(storage.path(name))
+    except FileNotFoundError:
+        return False
+    return modified > time.time() - min_age
+
+
+def collect(name, min_age=None):
+    """Удаляет файл без ссылок вместе с миниатюрами и вариантами.
+
+    Строка счётчика удаляется первой и остаётся заблокированной до
+    конца транзакции: acquire ждёт, пока ссылки перепроверяются по
+    таблице постов. Файл моложе min_age секунд (по умолчанию
+    MEDIA_COLLECT_MIN_AGE) остаётся на диске.
+    """
+    if min_age is None:
+        min_age = settings.MEDIA_COLLECT_MIN_AGE
+    with transaction.atomic():
+        MediaFile.objects.filter(name=name).delete()
+        refs = Post.objects.filter(image=name).count()
+        if refs or _is_recent(name, min_age):
+            MediaFile.objects.create(name=name, refs=refs)
+            return False
+        purge(name)
+    return True
+
+
+def purge(name):
+    """Удаляет файл картинки, её миниатюры и варианты."""
+    delete_thumbnails(thumbnails.source(name), delete_file=False)
+    variants.delete(name)
+    Post._meta.get_field("image").storage.delete(name)
+
+
+def repair(post_ids):
+    """Пересчитывает счётчики ссылок на картинки постов из подзапроса
+    post_ids: один UPDATE для известных файлов и bulk_create для
+    новых."""
+    names = (
+        Post.objects.filter(pk__in=post_ids).exclude(image="").values("image")
+    )
+    refs = (
+        Post.objects.filter(image=OuterRef("name"))
+        .order_by()
+        .values("image")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    MediaFile.objects.filter(name__in=names).update(
+        refs=Coalesce(Subquery(refs), 0)
+    )
+    counts = (
+        Post.objects.filter(image__in=names)
+        .exclude(image__in=MediaFile.objects.values("name"))
+        .order_by()
+        .values("image")
+        .annotate(total=Count("pk"))
+        .values_list("image", "total")
+    )
+    MediaFile.objects.bulk_create(
+        (
+            MediaFile(name=name, refs=total)
+            for name, total in counts.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+def repair_all():
+    """Пересчитывает счётчики ссылок по таблице постов и возвращает
+    имена файлов, на которые больше никто не ссылается."""
+    counts = (
+        Post.objects.exclude(image="")
+        .order_by()
+        .values("image")
+        .annotate(total=Count("pk"))
+        .values_list("image", "total")
+    )
+    with transaction.atomic():
+        MediaFile.objects.update(refs=0)
+        for name, total in counts.iterator():
+            MediaFile.objects.update_or_create(
+                name=name, defaults={"refs": total}
+            )
+    return list(
+        MediaFile.objects.filter(refs=0).values_list("name", flat=True)
+    )
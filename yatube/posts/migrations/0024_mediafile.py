@@ -0,0 +1,47 @@
+# Generated by Django 4.1.7 on 2026-10-18 19:01
+
+from django.db import migrations, models
+from django.db.models import Count
+import posts.storage
+
+
+def fill_refs(apps, schema_editor):
+    Post = apps.get_model("posts", "Post")
+    MediaFile = apps.get_model("posts", "MediaFile")
+    counts = (
+        Post.objects.exclude(image="")
+        .order_by()
+        .values("image")
+        .annotate(total=Count("pk"))
+    )
+    MediaFile.objects.bulk_create(
+        MediaFile(name=row["image"], refs=row["total"])
+        for row in counts.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0023_imagevariant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Файл')),
+                ('refs', models.PositiveIntegerField(default=0, verbose_name='Количество ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=posts.storage.HashedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(fill_refs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations
+
+# Строка на пост (rowid — id поста) и строка на комментарий (rowid — id
+# комментария, post_id — его пост), чтобы новый комментарий не
+# переписывал текст всего обсуждения.
+CREATE = (
+    """
+    CREATE VIRTUAL TABLE posts_search USING fts5(
+        text, tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE posts_comment_search USING fts5(
+        text, post_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    "INSERT INTO posts_search(rowid, text) SELECT id, text FROM posts_post",
+    """
+    INSERT INTO posts_comment_search(rowid, text, post_id)
+    SELECT id, text, post_id FROM posts_comment
+    """,
+)
+
+
+def create_index(apps, schema_editor):
+    # Полнотекстовый индекс есть только в SQLite, на других СУБД
+    # поиск работает через icontains.
+    if schema_editor.connection.vendor == "sqlite":
+        for sql in CREATE:
+            schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS posts_search")
+        schema_editor.execute("DROP TABLE IF EXISTS posts_comment_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0024_mediafile'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
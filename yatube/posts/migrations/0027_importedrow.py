@@ -0,0 +1,35 @@
+# Generated by Django 4.1.7 on 2026-10-18 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0026_admin_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportedRow',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(max_length=16, verbose_name='Таблица')),
+                ('source_id', models.CharField(max_length=64, verbose_name='id в файле')),
+                ('object_id', models.PositiveIntegerField(verbose_name='id в базе')),
+                ('maintained', models.BooleanField(default=False, verbose_name='Обработана')),
+            ],
+            options={
+                'verbose_name': 'Загруженная строка',
+                'verbose_name_plural': 'Загруженные строки',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='importedrow',
+            index=models.Index(fields=['maintained', 'table'], name='imported_row_maintained_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='importedrow',
+            constraint=models.UniqueConstraint(fields=('table', 'source_id'), name='unique_imported_row'),
+        ),
+    ]
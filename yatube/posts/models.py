@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from .storage import HashedStorage
+
 User = get_user_model()
 
 
@@ -8,6 +10,9 @@ class Group(models.Model):
     title = models.CharField("Название группы", max_length=200)
     slug = models.SlugField("Строка идентификатор", unique=True)
     description = models.TextField("Описание группы")
+    posts_count = models.PositiveIntegerField(
+        "Количество постов", default=0, editable=False
+    )
 
     class Meta:
         ordering = ("title",)
@@ -43,12 +48,28 @@ class Post(models.Model):
         related_name="posts",
         on_delete=models.SET_NULL,
     )
-    image = models.ImageField("Картинка", upload_to="posts/", blank=True)
+    image = models.ImageField(
+        "Картинка", upload_to="posts/", blank=True, storage=HashedStorage()
+    )
+    comments_count = models.PositiveIntegerField(
+        "Количество комментариев", default=0, editable=False
+    )
 
     class Meta:
         ordering = ("-pub_date",)
         verbose_name = "Пост"
         verbose_name_plural = "Посты"
+        indexes = (
+            models.Index(
+                fields=("author", "-pub_date"),
+                name="post_author_pub_date_idx",
+            ),
+            models.Index(
+                fields=("group", "-pub_date"),
+                name="post_group_pub_date_idx",
+            ),
+            models.Index(fields=("-pub_date",), name="post_pub_date_idx"),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -83,6 +104,13 @@ class Comment(models.Model):
         ordering = ("-created",)
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
+        indexes = (
+            models.Index(
+                fields=("post", "-created"),
+                name="comment_post_created_idx",
+            ),
+            models.Index(fields=("-created",), name="comment_created_idx"),
+        )
 
 
 class Follow(models.Model):
@@ -103,3 +131,121 @@ class Follow(models.Model):
         ordering = ("user",)
         verbose_name = "Подписчик"
         verbose_name_plural = "Подписчики"
+        constraints = (
+            models.UniqueConstraint(
+                fields=("user", "author"), name="unique_follow"
+            ),
+        )
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Читатель",
+        related_name="timeline",
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        verbose_name="Пост",
+        related_name="timeline_entries",
+    )
+    pub_date = models.DateTimeField("Дата публикации поста")
+
+    class Meta:
+        ordering = ("-pub_date", "-post_id")
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи ленты"
+        constraints = (
+            models.UniqueConstraint(
+                fields=("user", "post"), name="unique_timeline_entry"
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=("user", "-pub_date", "-post"),
+                name="timeline_user_pub_date_idx",
+            ),
+        )
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name="Пользователь",
+        related_name="stats",
+    )
+    posts_count = models.PositiveIntegerField("Количество постов", default=0)
+    followers_count = models.PositiveIntegerField(
+        "Количество подписчиков", default=0
+    )
+    following_count = models.PositiveIntegerField(
+        "Количество подписок", default=0
+    )
+
+    class Meta:
+        verbose_name = "Счётчики пользователя"
+        verbose_name_plural = "Счётчики пользователей"
+
+
+class ImageVariant(models.Model):
+    source = models.CharField("Исходная картинка", max_length=255)
+    width = models.PositiveSmallIntegerField("Ширина")
+    format = models.CharField("Формат", max_length=10)
+    file = models.FileField("Файл", upload_to="variants/")
+    size = models.PositiveIntegerField("Размер в байтах")
+
+    class Meta:
+        ordering = ("source", "format", "width")
+        verbose_name = "Вариант картинки"
+        verbose_name_plural = "Варианты картинок"
+        constraints = (
+            models.UniqueConstraint(
+                fields=("source", "format", "width"),
+                name="unique_image_variant",
+            ),
+        )
+
+    def __str__(self):
+        return f"{self.source} {self.width}w {self.format}"
+
+
+class MediaFile(models.Model):
+    name = models.CharField("Файл", max_length=255, primary_key=True)
+    refs = models.PositiveIntegerField("Количество ссылок", default=0)
+
+    class Meta:
+        verbose_name = "Файл картинки"
+        verbose_name_plural = "Файлы картинок"
+
+    def __str__(self):
+        return f"{self.name} ({self.refs})"
+
+
+class ImportedRow(models.Model):
+    """Строка, загруженная import_data: повторный импорт того же файла
+    по ней пропускает уже загруженное. Пока счётчики, ленты и индекс
+    для строки не обновлены, maintained ложно."""
+
+    table = models.CharField("Таблица", max_length=16)
+    source_id = models.CharField("id в файле", max_length=64)
+    object_id = models.PositiveIntegerField("id в базе")
+    maintained = models.BooleanField("Обработана", default=False)
+
+    class Meta:
+        verbose_name = "Загруженная строка"
+        verbose_name_plural = "Загруженные строки"
+        constraints = (
+            models.UniqueConstraint(
+                fields=("table", "source_id"), name="unique_imported_row"
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=("maintained", "table"),
+                name="imported_row_maintained_idx",
+            ),
+        )
@@ -0,0 +1,145 @@
+"""Кеш целых страниц для анонимных посетителей.
+
+Декоратор знает области страницы (пост, автор, группа, лента) и
+помечает ответ заголовком Surrogate-Key с их списком. Вместе со
+страницей в кеше хранится версия этих областей из fragments, снятая
+до вызова представления: изменение во время рендера оставит страницу
+устаревшей. Ключ строится из пути и только тех параметров запроса,
+которые читает представление. Устаревшую страницу рендерит заново
+один процесс, остальные в это время отдают её старую копию.
+"""
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+
+from core import singleflight
+
+from . import fragments
+
+PAGE_KEY = "page-cache:{}"
+STATS_KEY = "page-cache-stats:{}"
+STATS = ("hits", "misses", "stale")
+SURROGATE_HEADER = "Surrogate-Key"
+
+
+def tag(response, *scopes):
+    """Помечает ответ областями, при изменении которых он устаревает."""
+    response[SURROGATE_HEADER] = " ".join(scopes)
+    return response
+
+
+def _count(name):
+    key = STATS_KEY.format(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+def stats():
+    """Возвращает счётчики попаданий, промахов и устаревших страниц."""
+    keys = {STATS_KEY.format(name): name for name in STATS}
+    values = cache.get_many(keys)
+    return {name: values.get(key, 0) for key, name in keys.items()}
+
+
+def reset_stats():
+    cache.delete_many([STATS_KEY.format(name) for name in STATS])
+
+
+def _cacheable(request):
+    return (
+        request.method in ("GET", "HEAD")
+        and not request.user.is_authenticated
+    )
+
+
+def _lookup(key):
+    """Возвращает страницу из кеша и признак того, что она устарела."""
+    entry = cache.get(key)
+    if entry is None:
+        return None, False
+    response, scopes, version, fresh_until = entry
+    stale = (
+        fresh_until < time.time()
+        or fragments.get_version(*scopes) != version
+    )
+    return response, stale
+
+
+def _key(request, params):
+    query = [
+        (name, request.GET[name]) for name in params if name in request.GET
+    ]
+    path = f"{request.path}?{urlencode(query)}" if query else request.path
+    return PAGE_KEY.format(path)
+
+
+def _store(key, response, scopes, version):
+    if (
+        response.status_code != 200
+        or response.streaming
+        or response.cookies
+    ):
+        return
+    timeout = settings.PAGE_CACHE_TIMEOUT
+    cache.set(
+        key,
+        (response, scopes, version, time.time() + timeout),
+        timeout * singleflight.GRACE_FACTOR,
+    )
+
+
+def cache_anonymous_page(scopes, params=()):
+    """Отдаёт анонимным GET-запросам страницу из кеша.
+
+    scopes — кортеж областей страницы или функция, которая получает
+    аргументы из URL и возвращает их; вызывается только при промахе.
+    params — параметры запроса, от которых зависит страница, остальные
+    в ключ кеша не попадают.
+    """
+    get_scopes = scopes if callable(scopes) else lambda *a, **kw: scopes
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _cacheable(request):
+                return view(request, *args, **kwargs)
+            return _cached(view, get_scopes, params, request, args, kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _cached(view, get_scopes, params, request, args, kwargs):
+    key = _key(request, params)
+    response, stale = _lookup(key)
+    if response is not None and not stale:
+        _count("hits")
+        response["X-Cache"] = "HIT"
+        return response
+    if stale:
+        _count("stale")
+        if not singleflight.acquire(key):
+            singleflight.record("stale_serves")
+            response["X-Cache"] = "STALE"
+            return response
+    else:
+        _count("misses")
+    try:
+        scopes = get_scopes(*args, **kwargs)
+        version = fragments.get_version(*scopes)
+        response = tag(view(request, *args, **kwargs), *scopes)
+        _store(key, response, scopes, version)
+    finally:
+        if stale:
+            singleflight.release(key)
+            singleflight.record("recomputes")
+    response["X-Cache"] = "MISS"
+    patch_vary_headers(response, ("Cookie",))
+    return response
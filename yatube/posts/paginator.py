@@ -0,0 +1,275 @@
+import base64
+import collections.abc
+from datetime import datetime
+
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+# Первичные ключи — 64-битные целые со знаком.
+MAX_PK = 2**63
+# Дальше этого числа строк отфильтрованные списки не досчитываются.
+COUNT_LIMIT = 10000
+
+
+def encode_cursor(values):
+    """Упаковывает значения ключа сортировки в строку для URL."""
+    raw = "|".join(
+        value.isoformat() if isinstance(value, datetime) else str(value)
+        for value in values
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, parse=datetime.fromisoformat):
+    """Распаковывает курсор, возвращает None для испорченной строки.
+
+    Курсор приходит из URL и может быть подделан: id вне диапазона
+    64-битного ключа тоже считается испорченным, а дата без пояса
+    читается в текущем поясе.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key, pk = base64.urlsafe_b64decode(padded).decode().split("|")
+        key, pk = parse(key), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not 0 < pk < MAX_PK:
+        return None
+    if isinstance(key, datetime) and timezone.is_naive(key):
+        key = timezone.make_aware(key)
+    return key, pk
+
+
+class CursorPage(collections.abc.Sequence):
+    """Страница ленты без подсчёта общего количества записей."""
+
+    is_cursor = True
+
+    def __init__(self, object_list, next_cursor, previous_cursor, number):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.number = number
+
+    def __repr__(self):
+        return f"<CursorPage {self.number}>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset-пагинация по паре полей (дата, id) в порядке убывания.
+
+    Вместо OFFSET и COUNT(*) каждая страница выбирается условием
+    по ключу последней показанной записи, поэтому стоимость запроса
+    не зависит от глубины страницы.
+    """
+
+    def __init__(self, object_list, per_page, keys=("pub_date", "id")):
+        self.object_list = object_list
+        self.per_page = per_page
+        self.keys = keys
+
+    def _cursor(self, obj):
+        return encode_cursor(getattr(obj, key) for key in self.keys)
+
+    def _seek(self, values, newer):
+        date_key, pk_key = self.keys
+        date, pk = values
+        lookup = "gt" if newer else "lt"
+        return Q(**{f"{date_key}__{lookup}": date}) | Q(
+            **{date_key: date, f"{pk_key}__{lookup}": pk}
+        )
+
+    def get_page(self, after=None, before=None):
+        """Возвращает страницу после курсора after или перед before.
+
+        Нераспознанный курсор приводит к первой странице.
+        """
+        date_key, pk_key = self.keys
+        after = after and decode_cursor(after)
+        before = before and decode_cursor(before)
+        queryset = self.object_list
+        if before:
+            rows = list(
+                queryset.filter(self._seek(before, newer=True)).order_by(
+                    date_key, pk_key
+                )[: self.per_page + 1]
+            )
+            has_more = len(rows) > self.per_page
+            rows = rows[: self.per_page][::-1]
+            has_newer, has_older = has_more, True
+            number = encode_cursor(before) + "<"
+        else:
+            if after:
+                queryset = queryset.filter(self._seek(after, newer=False))
+            rows = list(
+                queryset.order_by(f"-{date_key}", f"-{pk_key}")[
+                    : self.per_page + 1
+                ]
+            )
+            has_older = len(rows) > self.per_page
+            rows = rows[: self.per_page]
+            has_newer = bool(after)
+            number = encode_cursor(after) + ">" if after else 1
+        if not rows:
+            return CursorPage(rows, None, None, number)
+        return CursorPage(
+            rows,
+            next_cursor=self._cursor(rows[-1]) if has_older else None,
+            previous_cursor=self._cursor(rows[0]) if has_newer else None,
+            number=number,
+        )
+
+
+def estimate_count(model, using="default"):
+    """Примерное число строк таблицы по статистике СУБД без полного
+    прохода. None, если оценить нельзя."""
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == "postgresql":
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass"
+        params = [table]
+    elif connection.vendor == "mysql":
+        sql = (
+            "SELECT table_rows FROM information_schema.tables "
+            "WHERE table_schema = DATABASE() AND table_name = %s"
+        )
+        params = [table]
+    elif connection.vendor == "sqlite":
+        # Наибольший rowid берётся из конца B-дерева; удалённые строки
+        # делают оценку чуть больше настоящей.
+        sql = f"SELECT max(rowid) FROM {connection.ops.quote_name(table)}"
+        params = []
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class AtLeast(int):
+    """Число строк, известное только снизу: выводится как «10000+»."""
+
+    def __str__(self):
+        return f"{int(self)}+"
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator для больших таблиц в админке.
+
+    Для списка без фильтров число строк берётся из estimate_count, а
+    отфильтрованный список считается не дальше COUNT_LIMIT строк.
+    Если их больше, count — AtLeast(COUNT_LIMIT), а листать можно и
+    дальше: за последней открытой страницей всегда есть следующая,
+    пока страница не окажется неполной.
+    """
+
+    requested = 1
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.has_filters():
+            estimate = estimate_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > COUNT_LIMIT:
+                return estimate
+        count = queryset.order_by()[: COUNT_LIMIT + 1].count()
+        return AtLeast(COUNT_LIMIT) if count > COUNT_LIMIT else count
+
+    @cached_property
+    def num_pages(self):
+        num_pages = super().num_pages
+        if isinstance(self.count, AtLeast):
+            num_pages = max(num_pages, self.requested) + 1
+        return num_pages
+
+    def validate_number(self, number):
+        try:
+            self.requested = max(int(number), 1)
+        except (TypeError, ValueError):
+            pass
+        return super().validate_number(number)
+
+    def page(self, number):
+        if not isinstance(self.count, AtLeast):
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        objects = list(self.object_list[bottom:top])
+        if not objects and number > 1:
+            raise EmptyPage("Нет такой страницы")
+        if len(objects) < self.per_page:
+            # Конец списка найден: следующей страницы нет.
+            self.num_pages = number
+        return self._get_page(objects, number, self)
+
+
+class RangePaginator:
+    """Делит queryset на страницы по диапазонам первичного ключа.
+
+    Страница n — строки с pk в ((n - 1) * per_page, n * per_page]:
+    она выбирается диапазоном по индексу без OFFSET, а число страниц
+    считается по наибольшему pk. После удалений страница может быть
+    короче per_page, но не длиннее.
+    """
+
+    def __init__(self, object_list, per_page):
+        self.object_list = object_list
+        self.per_page = per_page
+
+    @cached_property
+    def num_pages(self):
+        last = self.object_list.aggregate(last=Max("pk"))["last"] or 0
+        return max(-(-last // self.per_page), 1)
+
+    @cached_property
+    def page_range(self):
+        """Номера непустых страниц: диапазон, целиком попавший между
+        удалёнными строками, пропускается. Каждая страница проверяется
+        запросом exists() по индексу."""
+        return [
+            number
+            for number in range(1, self.num_pages + 1)
+            if self.object_list.filter(
+                pk__gt=(number - 1) * self.per_page,
+                pk__lte=number * self.per_page,
+            ).exists()
+        ]
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("Номер страницы не число")
+        if number < 1 or number > self.num_pages:
+            raise EmptyPage("Нет такой страницы")
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        start = (number - 1) * self.per_page
+        rows = self.object_list.filter(
+            pk__gt=start, pk__lte=start + self.per_page
+        ).order_by("pk")
+        return Page(list(rows), number, self)
@@ -0,0 +1,51 @@
+"""Области кеша (см. fragments) для страниц по аргументам их URL.
+
+Функции отдаются декоратору pagecache.cache_anonymous_page и лентам
+RSS/Atom, поэтому страница и лента одного объекта устаревают вместе.
+Неизвестный объект даёт Http404.
+"""
+from django.http import Http404
+
+from . import groups
+from .models import Post, User
+
+
+def index_scopes():
+    return ("index",)
+
+
+def group_scopes(slug):
+    group = groups.get_by_slug(slug)
+    if group is None:
+        raise Http404
+    return (f"group:{group.pk}",)
+
+
+def profile_scopes(username):
+    author_id = (
+        User.objects.filter(username=username)
+        .values_list("pk", flat=True)
+        .first()
+    )
+    if author_id is None:
+        raise Http404
+    # Профиль показывает и подписчиков автора, и его подписки.
+    return (
+        f"author:{author_id}",
+        "groups",
+        f"followers:{author_id}",
+        f"follower:{author_id}",
+    )
+
+
+def post_scopes(post_id):
+    post = (
+        Post.objects.filter(pk=post_id)
+        .values_list("author_id", "group_id")
+        .first()
+    )
+    if post is None:
+        raise Http404
+    author_id, group_id = post
+    scopes = (f"post:{post_id}", f"author:{author_id}")
+    return scopes + (f"group:{group_id}",) if group_id else scopes
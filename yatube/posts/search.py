@@ -0,0 +1,243 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+В SQLite индекс — две виртуальные таблицы FTS5: posts_search со
+строкой на пост (rowid равен id поста) и posts_comment_search со
+строкой на комментарий (rowid равен id комментария, post_id — его
+пост). Сигналы моделей переписывают только изменившуюся строку, а
+rebuild заполняет индекс заново. Пост ранжируется по лучшему из своих
+совпадений (bm25 с весом), все совпадения упорядочиваются в SQLite и
+листаются курсором (ранг, id). На других СУБД поиск сводится к
+icontains по тексту поста.
+"""
+import re
+from html import escape
+
+from django.db import connection
+from django.db.models import Q, QuerySet
+from django.utils.safestring import mark_safe
+
+from . import groups
+from .models import Comment, Post
+from .paginator import CursorPage, decode_cursor, encode_cursor
+
+TABLE = "posts_search"
+COMMENT_TABLE = "posts_comment_search"
+# Совпадение в тексте поста весит вдвое больше, чем в комментарии.
+POST_WEIGHT, COMMENT_WEIGHT = 2.0, 1.0
+SNIPPET_WORDS = 24
+MARK_START, MARK_END = "\x02", "\x03"
+
+
+def enabled():
+    return connection.vendor == "sqlite"
+
+
+def match_query(query):
+    """Превращает ввод пользователя в запрос FTS5: все слова должны
+    встретиться, каждое может быть началом слова в тексте."""
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", query))
+
+
+def _ids_sql(ids):
+    """SQL и параметры для "IN (...)": ids — список или подзапрос
+    values(). Для пустого списка возвращает None."""
+    if isinstance(ids, QuerySet):
+        return ids.order_by().query.sql_with_params()
+    if not ids:
+        return None
+    return ", ".join(["%s"] * len(ids)), list(ids)
+
+
+def index_post(post_id):
+    """Переписывает строку индекса для текста поста."""
+    index_posts([post_id])
+
+
+def index_posts(post_ids):
+    """Переписывает строки индекса для постов из списка или
+    подзапроса."""
+    if not enabled() or (sql := _ids_sql(post_ids)) is None:
+        return
+    ids, params = sql
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid IN ({ids})", params)
+        cursor.execute(
+            f"INSERT INTO {TABLE}(rowid, text) "
+            f"SELECT id, text FROM {Post._meta.db_table} "
+            f"WHERE id IN ({ids})",
+            params,
+        )
+
+
+def delete_post(post_id):
+    """Удаляет строки индекса поста и его комментариев; вызывается до
+    удаления самих комментариев."""
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [post_id])
+        # post_id в таблице индекса не индексируется, поэтому строки
+        # выбираются по rowid из таблицы комментариев.
+        cursor.execute(
+            f"DELETE FROM {COMMENT_TABLE} WHERE rowid IN "
+            f"(SELECT id FROM {Comment._meta.db_table} WHERE post_id = %s)",
+            [post_id],
+        )
+
+
+def index_comment(comment):
+    """Переписывает строку индекса для одного комментария."""
+    index_comments([comment.pk])
+
+
+def index_comments(comment_ids):
+    """Переписывает строки индекса для комментариев из списка или
+    подзапроса."""
+    if not enabled() or (sql := _ids_sql(comment_ids)) is None:
+        return
+    ids, params = sql
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {COMMENT_TABLE} WHERE rowid IN ({ids})", params
+        )
+        cursor.execute(
+            f"INSERT INTO {COMMENT_TABLE}(rowid, text, post_id) "
+            f"SELECT id, text, post_id FROM {Comment._meta.db_table} "
+            f"WHERE id IN ({ids})",
+            params,
+        )
+
+
+def delete_comment(comment_id):
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {COMMENT_TABLE} WHERE rowid = %s", [comment_id]
+        )
+
+
+def rebuild():
+    """Строит индекс заново по всем постам и комментариям."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+        cursor.execute(f"DELETE FROM {COMMENT_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {TABLE}(rowid, text) "
+            f"SELECT id, text FROM {Post._meta.db_table}"
+        )
+        cursor.execute(
+            f"INSERT INTO {COMMENT_TABLE}(rowid, text, post_id) "
+            f"SELECT id, text, post_id FROM {Comment._meta.db_table}"
+        )
+        for table in (TABLE, COMMENT_TABLE):
+            cursor.execute(
+                f"INSERT INTO {table}({table}) VALUES ('optimize')"
+            )
+
+
+def _highlight(snippet):
+    """Экранирует фрагмент и выделяет найденные слова."""
+    html = escape(snippet)
+    html = html.replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
+    return mark_safe(html)
+
+
+# Лучшее совпадение поста: bare-колонки source и doc_id SQLite берёт
+# из строки, на которой достигнут min(rank).
+RANKED = f"""
+    SELECT post_id, min(rank) AS search_rank, source, doc_id FROM (
+        SELECT rowid AS post_id, bm25({TABLE}) * {POST_WEIGHT} AS rank,
+            0 AS source, rowid AS doc_id
+        FROM {TABLE} WHERE {TABLE} MATCH %s
+        UNION ALL
+        SELECT post_id, bm25({COMMENT_TABLE}) * {COMMENT_WEIGHT},
+            1, rowid
+        FROM {COMMENT_TABLE} WHERE {COMMENT_TABLE} MATCH %s
+    )
+    GROUP BY post_id
+"""
+
+
+def _snippets(cursor, table, match, doc_ids):
+    if not doc_ids:
+        return {}
+    placeholders = ", ".join(["%s"] * len(doc_ids))
+    cursor.execute(
+        f"SELECT rowid, snippet({table}, 0, %s, %s, '…', {SNIPPET_WORDS}) "
+        f"FROM {table} WHERE {table} MATCH %s "
+        f"AND rowid IN ({placeholders})",
+        [MARK_START, MARK_END, match, *doc_ids],
+    )
+    return dict(cursor.fetchall())
+
+
+def _search_fts(query, per_page, after):
+    match = match_query(query)
+    sql = RANKED
+    params = [match, match]
+    if after:
+        sql += (
+            " HAVING search_rank > %s"
+            " OR (search_rank = %s AND post_id > %s)"
+        )
+        params += [after[0], after[0], after[1]]
+    sql += " ORDER BY search_rank, post_id LIMIT %s"
+    params.append(per_page + 1)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        page = rows[:per_page]
+        snippets = [
+            _snippets(
+                cursor,
+                table,
+                match,
+                [doc_id for _, _, src, doc_id in page if src == source],
+            )
+            for source, table in enumerate((TABLE, COMMENT_TABLE))
+        ]
+    posts = Post.objects.select_related("author").in_bulk(
+        [pk for pk, _, _, _ in page]
+    )
+    groups.attach(posts.values())
+    results = []
+    for pk, search_rank, source, doc_id in page:
+        post = posts.get(pk)
+        if post is not None:
+            post.search_rank = search_rank
+            post.snippet = _highlight(snippets[source].get(doc_id, ""))
+            results.append(post)
+    return results, len(rows) > per_page
+
+
+def _search_like(query, per_page, after):
+    condition = Q()
+    for word in re.findall(r"\w+", query):
+        condition &= Q(text__icontains=word)
+    posts = Post.objects.filter(condition).select_related("author")
+    if after:
+        posts = posts.filter(id__lt=after[1])
+    rows = list(posts.order_by("-id")[: per_page + 1])
+    for post in groups.attach(rows):
+        post.search_rank = -post.id
+    return rows[:per_page], len(rows) > per_page
+
+
+def search(query, per_page, after=None):
+    """Возвращает CursorPage с найденными постами, лучшие первыми.
+
+    У постов заполнены search_rank и, для FTS5, snippet — фрагмент
+    текста с выделенными словами.
+    """
+    after = after and decode_cursor(after, parse=float)
+    if not re.search(r"\w", query):
+        return CursorPage([], None, None, 1)
+    find = _search_fts if enabled() else _search_like
+    results, has_more = find(query, per_page, after)
+    next_cursor = None
+    if has_more and results:
+        last = results[-1]
+        next_cursor = encode_cursor((last.search_rank, last.id))
+    number = f"{encode_cursor(after)}>" if after else 1
+    return CursorPage(results, next_cursor, None, number)
@@ -0,0 +1,149 @@
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from . import (
+    counters,
+    fragments,
+    groups,
+    media,
+    search,
+    sitemaps,
+    timeline,
+)
+from .models import Comment, Follow, Group, Post
+
+
+def _post_scopes(post, *group_ids):
+    group_scopes = {f"group:{pk}" for pk in group_ids if pk is not None}
+    return (
+        "index",
+        f"post:{post.pk}",
+        f"author:{post.author_id}",
+        *group_scopes,
+    )
+
+
+@receiver(pre_save, sender=Post)
+def post_group_before_save(sender, instance, raw=False, **kwargs):
+    instance._saved_group_id = None
+    instance._saved_image = ""
+    if not raw and not instance._state.adding:
+        saved = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list("group_id", "image")
+            .first()
+        )
+        if saved is not None:
+            instance._saved_group_id, instance._saved_image = saved
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    fragments.bump_on_commit(
+        *_post_scopes(instance, instance.group_id, instance._saved_group_id)
+    )
+    search.index_post(instance.pk)
+    if created:
+        fragments.bump_on_commit(*sitemaps.post_scopes(instance))
+        timeline.fan_out_post(instance)
+        counters.shift_user(instance.author_id, posts_count=1)
+        counters.shift_group(instance.group_id, 1)
+        media.acquire(instance.image.name)
+        return
+    if instance._saved_group_id != instance.group_id:
+        counters.shift_group(instance._saved_group_id, -1)
+        counters.shift_group(instance.group_id, 1)
+    if instance._saved_image != instance.image.name:
+        media.release(instance._saved_image)
+        media.acquire(instance.image.name)
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    # Пока строки комментариев ещё в базе, их строки индекса удаляются
+    # одним запросом, а не сигналом на каждый комментарий.
+    search.delete_post(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    fragments.bump_on_commit(
+        *_post_scopes(instance, instance.group_id),
+        *sitemaps.post_scopes(instance),
+    )
+    counters.shift_user(instance.author_id, posts_count=-1)
+    counters.shift_group(instance.group_id, -1)
+    media.release(instance.image.name)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    fragments.bump_on_commit(f"post:{instance.post_id}")
+    search.index_comment(instance)
+    if created:
+        counters.shift_post(instance.post_id, 1)
+
+
+def _deleted_with_post(comment, origin):
+    """Комментарий удаляется каскадом вместе со своим постом: индекс,
+    версию и счётчик поста уже обработали сигналы поста."""
+    if isinstance(origin, Post):
+        return origin.pk == comment.post_id
+    return isinstance(origin, QuerySet) and origin.model is Post
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, origin=None, **kwargs):
+    if _deleted_with_post(instance, origin):
+        return
+    fragments.bump_on_commit(f"post:{instance.post_id}")
+    search.delete_comment(instance.pk)
+    counters.shift_post(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        fragments.bump_on_commit(
+            f"follower:{instance.user_id}", f"followers:{instance.author_id}"
+        )
+        timeline.backfill(instance.user_id, instance.author_id)
+        counters.shift_user(instance.author_id, followers_count=1)
+        counters.shift_user(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    fragments.bump_on_commit(
+        f"follower:{instance.user_id}", f"followers:{instance.author_id}"
+    )
+    timeline.prune(instance.user_id, instance.author_id)
+    counters.shift_user(instance.author_id, followers_count=-1)
+    counters.shift_user(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        # Свой кеш сбрасывается сразу, чтобы этот же запрос видел
+        # изменение, и ещё раз после фиксации вместе с версией.
+        groups.invalidate()
+        transaction.on_commit(groups.invalidate)
+        fragments.bump_on_commit(
+            "index",
+            "groups",
+            f"group:{instance.pk}",
+            *sitemaps.GROUP_SCOPES,
+        )
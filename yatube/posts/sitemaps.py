@@ -0,0 +1,164 @@
+"""Карта сайта: посты, профили авторов и группы.
+
+Посты и профили делятся на части по SHARD_SIZE адресов диапазонами
+первичного ключа (RangePaginator), поэтому любая часть читается по
+индексу без OFFSET. Части лежат по адресам /sitemap-<раздел>-<n>.xml,
+а /sitemap.xml перечисляет непустые из них. Команда render_sitemaps
+сохраняет те же файлы под теми же именами, чтобы их отдавал
+веб-сервер.
+
+Кеш страниц карты зависит не от ленты, а от своих областей: части
+раздела ("sitemap:posts:3", "sitemap:groups") и индекса ("sitemap").
+Их сбрасывают только появление и удаление постов и изменения групп:
+правка текста поста карту не меняет, а смена имени пользователя
+попадёт в карту через PAGE_CACHE_TIMEOUT.
+"""
+from django.contrib.sitemaps import Sitemap
+from django.contrib.sitemaps.views import SitemapIndexItem, x_robots_tag
+from django.contrib.sites.shortcuts import get_current_site
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import Exists, Max, OuterRef
+from django.http import Http404, HttpResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.functional import cached_property
+
+from . import groups, pagecache
+from .models import Post, User
+from .paginator import RangePaginator
+
+# Предел протокола sitemaps.org для одного файла.
+SHARD_SIZE = 50000
+CONTENT_TYPE = "application/xml"
+
+
+class ShardedSitemap(Sitemap):
+    limit = SHARD_SIZE
+
+    @cached_property
+    def paginator(self):
+        return RangePaginator(self.items(), self.limit)
+
+
+class PostSitemap(ShardedSitemap):
+    changefreq = "weekly"
+
+    def items(self):
+        return Post.objects.only("pub_date")
+
+    def location(self, post):
+        return reverse("posts:post_detail", args=(post.pk,))
+
+    def lastmod(self, post):
+        return post.pub_date
+
+    def get_latest_lastmod(self):
+        return Post.objects.aggregate(latest=Max("pub_date"))["latest"]
+
+
+class ProfileSitemap(ShardedSitemap):
+    changefreq = "daily"
+
+    def items(self):
+        posts = Post.objects.filter(author_id=OuterRef("pk"))
+        return User.objects.filter(Exists(posts)).only("username")
+
+    def location(self, user):
+        return reverse("posts:profile", args=(user.username,))
+
+
+class GroupSitemap(Sitemap):
+    changefreq = "daily"
+
+    @property
+    def paginator(self):
+        # Без групп в разделе нет ни одной части.
+        return Paginator(
+            self.items(), self.limit, allow_empty_first_page=False
+        )
+
+    def items(self):
+        return groups.all_groups()
+
+    def location(self, group):
+        return reverse("posts:group_list", args=(group.slug,))
+
+
+SITEMAPS = {
+    "posts": PostSitemap,
+    "profiles": ProfileSitemap,
+    "groups": GroupSitemap,
+}
+
+
+def _shard(pk):
+    return -(-pk // ShardedSitemap.limit)
+
+
+def post_scopes(post):
+    """Области карты, которые меняются при появлении или удалении
+    поста: индекс, часть с постом и часть с профилем автора."""
+    return (
+        "sitemap",
+        f"sitemap:posts:{_shard(post.pk)}",
+        f"sitemap:profiles:{_shard(post.author_id)}",
+    )
+
+
+# Группы не делятся на части по pk, их раздел — одна область.
+GROUP_SCOPES = ("sitemap", "sitemap:groups")
+
+
+def _section_scopes(section, page):
+    if issubclass(SITEMAPS.get(section, Sitemap), ShardedSitemap):
+        return (f"sitemap:{section}:{page}",)
+    return (f"sitemap:{section}",)
+
+
+def shards():
+    """Пары (раздел, номер части) для непустых частей карты."""
+    for section, sitemap_class in SITEMAPS.items():
+        for page in sitemap_class().paginator.page_range:
+            yield section, page
+
+
+def render_index(request):
+    items = []
+    for section, sitemap_class in SITEMAPS.items():
+        sitemap = sitemap_class()
+        lastmod = sitemap.get_latest_lastmod()
+        for page in sitemap.paginator.page_range:
+            location = request.build_absolute_uri(
+                reverse("sitemap_section", args=(section, page))
+            )
+            items.append(SitemapIndexItem(location, lastmod))
+    return render_to_string("sitemap_index.xml", {"sitemaps": items})
+
+
+def render_section(request, section, page):
+    """XML части карты; Http404 для неизвестного раздела или части."""
+    if section not in SITEMAPS:
+        raise Http404("Нет такого раздела")
+    try:
+        urls = SITEMAPS[section]().get_urls(
+            page=page,
+            site=get_current_site(request),
+            protocol=request.scheme,
+        )
+    except (EmptyPage, PageNotAnInteger):
+        raise Http404("Нет такой части")
+    return render_to_string("sitemap.xml", {"urlset": urls})
+
+
+@x_robots_tag
+@pagecache.cache_anonymous_page(("sitemap",))
+def index(request):
+    return HttpResponse(render_index(request), content_type=CONTENT_TYPE)
+
+
+@x_robots_tag
+@pagecache.cache_anonymous_page(_section_scopes)
+def section(request, section, page):
+    return HttpResponse(
+        render_section(request, section, page), content_type=CONTENT_TYPE
+    )
@@ -0,0 +1,50 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Файл называется по SHA-256 своего содержимого, поэтому одинаковые
+загрузки занимают место на диске один раз и делят миниатюры и
+адаптивные варианты. Сколько постов ссылается на файл, считает
+таблица MediaFile (см. posts.media).
+"""
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks(CHUNK_SIZE):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class HashedStorage(FileSystemStorage):
+    """Сохраняет файл под именем <каталог>/<xx>/<sha256><расширение>.
+
+    Если такой файл уже есть, повторно он не записывается.
+    """
+
+    def hashed_name(self, name, content):
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        digest = content_hash(content)
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Свежее время изменения защищает файл от сборщика мусора,
+            # пока пост с новой ссылкой на него не сохранён.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
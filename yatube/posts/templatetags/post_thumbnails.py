@@ -0,0 +1,43 @@
+from django import template
+
+from posts import thumbnails, variants
+
+register = template.Library()
+
+
+@register.simple_tag
+def prefetch_images(posts, geometry="960x339"):
+    """Заранее находит миниатюры и srcset для всех картинок страницы,
+    чтобы карточки постов не ходили за ними по одной."""
+    images = [post.image for post in posts if post.image]
+    if not images:
+        return ""
+    found = thumbnails.lookup_many(images, geometry)
+    srcsets = variants.srcsets(image.name for image in images)
+    for image in images:
+        image.prefetched_thumbnails = {geometry: found[image.name]}
+        image.prefetched_srcset = srcsets.get(image.name, {})
+    return ""
+
+
+@register.filter
+def thumbnail_url(image, geometry):
+    """Адрес готовой миниатюры или исходной картинки, пока её нет."""
+    if not image:
+        return ""
+    prefetched = getattr(image, "prefetched_thumbnails", {})
+    if geometry in prefetched:
+        thumbnail = prefetched[geometry]
+    else:
+        thumbnail = thumbnails.lookup(image, geometry)
+    return thumbnail.url if thumbnail else image.url
+
+
+@register.simple_tag
+def image_srcset(image):
+    """srcset по форматам для одной картинки, пустой до построения."""
+    if not image:
+        return {}
+    if hasattr(image, "prefetched_srcset"):
+        return image.prefetched_srcset
+    return variants.srcsets([image.name]).get(image.name, {})
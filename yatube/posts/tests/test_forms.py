@@ -1,12 +1,15 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
+from ..forms import PostForm
 from ..models import Group, Post
 
 User = get_user_model()
@@ -58,13 +61,10 @@ class PostCreateFormTests(TestCase):
             reverse("posts:post_create"), data=form_data, follow=True
         )
         self.assertEqual(Post.objects.count(), posts_count + 1)
-        self.assertTrue(
-            Post.objects.filter(
-                text=form_data["text"],
-                group=form_data["group"],
-                image="posts/small.gif",
-            ).exists()
+        post = Post.objects.get(
+            text=form_data["text"], group=form_data["group"]
         )
+        self.assertRegex(post.image.name, r"^posts/\w\w/\w{64}\.gif$")
 
     def test_form_post_edit(self):
         """Проверка функции post_edit."""
@@ -85,3 +85,102 @@ class PostCreateFormTests(TestCase):
         self.post_3.refresh_from_db()
         self.assertEqual(self.post_3.text, form_data["text"])
         self.assertEqual(self.post_3.group.id, form_data["group"])
+
+
+def _jpeg_upload(size, exif=None):
+    buffer = BytesIO()
+    Image.new("RGB", size, "red").save(buffer, "JPEG", exif=exif or b"")
+    return SimpleUploadedFile(
+        "photo.jpg", buffer.getvalue(), content_type="image/jpeg"
+    )
+
+
+@override_settings(POST_IMAGE_MAX_SIDE=100, POST_IMAGE_MAX_PIXELS=1_000_000)
+class PostImageUploadTests(TestCase):
+    def _clean(self, upload):
+        form = PostForm(data={"text": "Текст"}, files={"image": upload})
+        form.is_valid()
+        return form
+
+    def test_large_image_is_downscaled(self):
+        """Большая картинка уменьшается до POST_IMAGE_MAX_SIDE."""
+        form = self._clean(_jpeg_upload((400, 200)))
+        self.assertTrue(form.is_valid())
+        with Image.open(form.cleaned_data["image"]) as image:
+            self.assertEqual(image.size, (100, 50))
+
+    def test_exif_is_stripped_and_orientation_applied(self):
+        """EXIF удаляется, а поворот из него применяется к пикселям."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = "Camera"
+        form = self._clean(_jpeg_upload((80, 40), exif=exif.tobytes()))
+        self.assertTrue(form.is_valid())
+        with Image.open(form.cleaned_data["image"]) as image:
+            self.assertEqual(image.size, (40, 80))
+            self.assertEqual(dict(image.getexif()), {})
+
+    def test_animation_metadata_is_stripped(self):
+        """У анимированных GIF и WebP удаляются EXIF, XMP и комментарии,
+        а кадры и их длительность сохраняются."""
+        exif = Image.Exif()
+        exif[0x010F] = "Camera"
+        frames = [
+            Image.new("RGB", (20, 20), color)
+            for color in ("red", "green", "blue")
+        ]
+        metadata = {
+            "WEBP": {"exif": exif.tobytes(), "xmp": b"<gps>55.7</gps>"},
+            "GIF": {"comment": b"gps 55.7"},
+        }
+        for fmt, extra in metadata.items():
+            with self.subTest(fmt=fmt):
+                file = BytesIO()
+                frames[0].save(
+                    file,
+                    fmt,
+                    save_all=True,
+                    append_images=frames[1:],
+                    duration=[100, 200, 300],
+                    loop=0,
+                    **extra,
+                )
+                form = self._clean(
+                    SimpleUploadedFile(f"anim.{fmt.lower()}", file.getvalue())
+                )
+                self.assertTrue(form.is_valid())
+                content = form.cleaned_data["image"].read()
+                self.assertNotIn(b"Camera", content)
+                self.assertNotIn(b"55.7", content)
+                with Image.open(BytesIO(content)) as image:
+                    durations = []
+                    for index in range(image.n_frames):
+                        image.seek(index)
+                        image.load()
+                        durations.append(image.info["duration"])
+                    self.assertEqual(durations, [100, 200, 300])
+
+    def test_mpo_saved_as_jpeg(self):
+        """Снимок с телефона в MPO принимается как JPEG из первого
+        кадра."""
+        file = BytesIO()
+        Image.new("RGB", (40, 20), "red").save(
+            file,
+            "MPO",
+            save_all=True,
+            append_images=[Image.new("RGB", (40, 20), "blue")],
+        )
+        form = self._clean(SimpleUploadedFile("phone.jpg", file.getvalue()))
+        self.assertTrue(form.is_valid(), form.errors)
+        with Image.open(form.cleaned_data["image"]) as image:
+            self.assertEqual(image.format, "JPEG")
+            self.assertEqual(image.size, (40, 20))
+            self.assertGreater(image.getpixel((0, 0))[0], 200)
+
+    def test_too_many_pixels_rejected(self):
+        """Картинка больше POST_IMAGE_MAX_PIXELS отклоняется."""
+        form = self._clean(_jpeg_upload((2000, 1000)))
+        self.assertFalse(form.is_valid())
+        self.assertEqual(
+            form.errors.as_data()["image"][0].code, "image_too_large"
+        )
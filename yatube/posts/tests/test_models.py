@@ -1,7 +1,34 @@
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
 
-from ..models import Group, Post
+from .. import media, search, thumbnails
+from ..counters import get_user_stats
+from ..management.commands import import_data
+from ..models import (
+    Comment,
+    Follow,
+    Group,
+    ImageVariant,
+    ImportedRow,
+    MediaFile,
+    Post,
+    UserStats,
+)
 
 User = get_user_model()
 
@@ -33,3 +60,383 @@ class PostModelTest(TestCase):
         self.assertEqual(
             text, str(post), "Ошибка в методе __str__ объекта класса Post"
         )
+
+    def test_follow_is_unique(self):
+        """Повторная подписка на автора запрещена ограничением."""
+        follower = User.objects.create_user(username="follower")
+        Follow.objects.create(user=follower, author=self.user)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=follower, author=self.user)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="auth")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(
+            title="Тестовая группа",
+            slug="test_slug",
+            description="Тестовое описание",
+        )
+        cls.group_2 = Group.objects.create(
+            title="Тестовая группа2",
+            slug="test_slug_2",
+            description="Тестовое описание",
+        )
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании и удалении записей."""
+        stats = get_user_stats(self.user)
+        post = Post.objects.create(
+            text="Тестовый пост", author=self.user, group=self.group
+        )
+        Comment.objects.create(post=post, author=self.reader, text="К")
+        Follow.objects.create(user=self.reader, author=self.user)
+        stats.refresh_from_db()
+        post.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.followers_count, 1)
+        self.assertEqual(get_user_stats(self.reader).following_count, 1)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        post.group = self.group_2
+        post.save()
+        self.group.refresh_from_db()
+        self.group_2.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.group_2.posts_count, 1)
+        post.delete()
+        Follow.objects.all().delete()
+        stats.refresh_from_db()
+        self.group_2.refresh_from_db()
+        self.assertEqual(stats.posts_count, 0)
+        self.assertEqual(stats.followers_count, 0)
+        self.assertEqual(self.group_2.posts_count, 0)
+
+    def test_repair_counters(self):
+        """Команда repair_counters пересчитывает испорченные счётчики."""
+        post = Post.objects.create(
+            text="Тестовый пост", author=self.user, group=self.group
+        )
+        Comment.objects.create(post=post, author=self.reader, text="К")
+        UserStats.objects.update(posts_count=42)
+        Post.objects.update(comments_count=42)
+        Group.objects.update(posts_count=42)
+        call_command("repair_counters", stdout=StringIO())
+        post.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(get_user_stats(self.user).posts_count, 1)
+        self.assertEqual(get_user_stats(self.reader).posts_count, 0)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b"\x47\x49\x46\x38\x39\x61\x02\x00"
+    b"\x01\x00\x80\x00\x00\x00\x00\x00"
+    b"\xFF\xFF\xFF\x21\xF9\x04\x00\x00"
+    b"\x00\x00\x00\x2C\x00\x00\x00\x00"
+    b"\x02\x00\x01\x00\x00\x02\x02\x0C"
+    b"\x0A\x00\x3B"
+)
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0, MEDIA_COLLECT_MIN_AGE=0
+)
+class MediaFileTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="auth")
+
+    def _post(self, name):
+        return Post.objects.create(
+            text="Пост с картинкой",
+            author=self.user,
+            image=SimpleUploadedFile(name, SMALL_GIF, "image/gif"),
+        )
+
+    def test_same_upload_is_stored_once(self):
+        """Одинаковые картинки хранятся одним файлом со счётчиком
+        ссылок, а файл удаляется вместе с последней ссылкой."""
+        first = self._post("cat.gif")
+        second = self._post("copy-of-cat.GIF")
+        self.assertEqual(first.image.name, second.image.name)
+        name = first.image.name
+        storage = first.image.storage
+        self.assertEqual(MediaFile.objects.get(name=name).refs, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(MediaFile.objects.get(name=name).refs, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+
+    def test_collect_rechecks_references(self):
+        """Файл со ссылкой не удаляется, даже если счётчик отстал."""
+        name = self._post("raced.gif").image.name
+        MediaFile.objects.filter(name=name).update(refs=0)
+        self.assertFalse(media.collect(name))
+        self.assertTrue(Post._meta.get_field("image").storage.exists(name))
+        self.assertEqual(MediaFile.objects.get(name=name).refs, 1)
+
+    @override_settings(MEDIA_COLLECT_MIN_AGE=600)
+    def test_fresh_file_is_kept(self):
+        """Свежий файл без ссылок остаётся для collect_media."""
+        post = self._post("fresh.gif")
+        name = post.image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        self.assertTrue(Post._meta.get_field("image").storage.exists(name))
+        self.assertEqual(MediaFile.objects.get(name=name).refs, 0)
+
+    def test_dedupe_media(self):
+        """Команда dedupe_media переносит старые картинки на имена по
+        хешу и удаляет лишние копии."""
+        storage = Post._meta.get_field("image").storage
+        posts = []
+        for name in ("posts/a.gif", "posts/b.gif"):
+            storage._save(name, ContentFile(SMALL_GIF))
+            posts.append(
+                Post.objects.create(
+                    text="Старый пост", author=self.user, image=name
+                )
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("dedupe_media", stdout=StringIO())
+        for post in posts:
+            post.refresh_from_db()
+        self.assertEqual(posts[0].image.name, posts[1].image.name)
+        self.assertNotIn(posts[0].image.name, ("posts/a.gif", "posts/b.gif"))
+        self.assertTrue(storage.exists(posts[0].image.name))
+        self.assertFalse(storage.exists("posts/a.gif"))
+        self.assertFalse(storage.exists("posts/b.gif"))
+        self.assertEqual(
+            MediaFile.objects.get(name=posts[0].image.name).refs, 2
+        )
+
+    def test_collect_media(self):
+        """collect_media находит и удаляет файлы без ссылок, а с
+        --limit продолжает с сохранённого места."""
+        storage = Post._meta.get_field("image").storage
+        kept = self._post("kept.gif").image.name
+        orphans = [
+            storage._save(f"posts/old/{number}.gif", ContentFile(SMALL_GIF))
+            for number in range(3)
+        ]
+        checkpoint = os.path.join(TEMP_MEDIA_ROOT, "gc-checkpoint")
+        options = {
+            "min_age": 0,
+            "checkpoint": checkpoint,
+            "stdout": StringIO(),
+        }
+        call_command("collect_media", limit=2, **options)
+        self.assertTrue(os.path.exists(checkpoint))
+        self.assertTrue(all(storage.exists(name) for name in orphans))
+        out = StringIO()
+        options["stdout"] = out
+        call_command("collect_media", delete=True, **options)
+        self.assertFalse(os.path.exists(checkpoint))
+        self.assertIn("удалено лишних: 2", out.getvalue())
+        call_command("collect_media", delete=True, **options)
+        self.assertFalse(any(storage.exists(name) for name in orphans))
+        self.assertTrue(storage.exists(kept))
+
+    def test_collect_media_thumbnails(self):
+        """collect_media удаляет миниатюры, которых нет в хранилище
+        ключей sorl, и оставляет известные."""
+        storage = Post._meta.get_field("image").storage
+        name = self._post("thumbed.gif").image.name
+        thumbnails.generate(name)
+        thumbnail = thumbnails.lookup(thumbnails.source(name), "960x339")
+        orphan = storage._save(
+            "cache/00/00/orphan.gif", ContentFile(SMALL_GIF)
+        )
+        call_command(
+            "collect_media", delete=True, min_age=0, stdout=StringIO()
+        )
+        self.assertFalse(storage.exists(orphan))
+        self.assertTrue(storage.exists(thumbnail.name))
+        self.assertTrue(storage.exists(name))
+        digest = os.path.basename(name)[:2]
+        for variant in ImageVariant.objects.filter(source=name):
+            self.assertTrue(
+                variant.file.name.startswith(f"variants/{digest}/")
+            )
+            self.assertTrue(storage.exists(variant.file.name))
+
+
+class ExportDataTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="auth")
+        cls.group = Group.objects.create(title="Группа", slug="group")
+        cls.old = Post.objects.create(text="Старый", author=cls.user)
+        Post.objects.filter(pk=cls.old.pk).update(
+            pub_date=datetime(2020, 1, 1, tzinfo=timezone.utc)
+        )
+        cls.new = Post.objects.create(
+            text="Новый", author=cls.user, group=cls.group
+        )
+        Comment.objects.create(post=cls.new, author=cls.user, text="Да")
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def _export(self, **options):
+        call_command(
+            "export_data", self.directory, stdout=StringIO(), **options
+        )
+
+    def test_jsonl(self):
+        self._export()
+        path = os.path.join(self.directory, "posts.jsonl")
+        with open(path, encoding="utf-8") as file:
+            rows = [json.loads(line) for line in file]
+        self.assertEqual([row["text"] for row in rows], ["Старый", "Новый"])
+        self.assertEqual(rows[1]["group_id"], self.group.pk)
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            [
+                f"{name}.jsonl"
+                for name in ("comments", "follows", "groups", "posts")
+            ],
+        )
+
+    def test_incremental_gzip_csv(self):
+        self._export(
+            format="csv", gzip=True, since="2021-01-01", chunk_size=1
+        )
+        path = os.path.join(self.directory, "posts.csv.gz")
+        with gzip.open(path, "rt", encoding="utf-8", newline="") as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual([row["text"] for row in rows], ["Новый"])
+        self.assertEqual(rows[0]["group_id"], str(self.group.pk))
+
+
+class ImportDataTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.reader = User.objects.create_user(username="reader")
+        Group.objects.create(title="Старая", slug="old")
+
+    def _write(self, table, rows):
+        path = os.path.join(self.directory, f"{table}.jsonl")
+        with open(path, "w", encoding="utf-8") as file:
+            for row in rows:
+                file.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def test_import_keeps_dates_and_repairs_derived_data(self):
+        self._write("groups", [{"slug": "new", "title": "Новая"}])
+        self._write(
+            "posts",
+            [
+                {
+                    "id": 10,
+                    "text": "Первый",
+                    "pub_date": "2015-03-01T10:00:00+00:00",
+                    "author": "writer",
+                    "group": "new",
+                },
+                {
+                    "id": 11,
+                    "text": "Второй",
+                    "pub_date": "2016-03-01T10:00:00+00:00",
+                    "author": "reader",
+                    "group": "old",
+                },
+            ],
+        )
+        self._write(
+            "comments",
+            [
+                {
+                    "id": 1,
+                    "post": 10,
+                    "text": "Да",
+                    "author": "reader",
+                    "created": "2015-03-02T10:00:00+00:00",
+                },
+                {"id": 2, "post": 99, "text": "Без поста", "author": "reader"},
+                {"post": 10, "text": "Без id", "author": "reader"},
+            ],
+        )
+        self._write("follows", [{"user": "reader", "author": "writer"}])
+        # Строка счётчиков уже есть и должна быть пересчитана.
+        get_user_stats(self.reader)
+        out = StringIO()
+        call_command("import_data", self.directory, batch_size=1, stdout=out)
+        self.assertIn("отклонено без id: 1", out.getvalue())
+        self.assertFalse(ImportedRow.objects.filter(maintained=False))
+        post = Post.objects.get(text="Первый")
+        self.assertEqual(
+            post.pub_date, datetime(2015, 3, 1, 10, tzinfo=timezone.utc)
+        )
+        self.assertEqual(post.author.username, "writer")
+        self.assertEqual(post.group.slug, "new")
+        self.assertEqual(post.group.posts_count, 1)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(Post.objects.get(text="Второй").group.slug, "old")
+        self.assertEqual(Comment.objects.get().created.year, 2015)
+        self.assertTrue(self.reader.timeline.filter(post=post).exists())
+        self.reader.refresh_from_db()
+        self.assertEqual(get_user_stats(self.reader).following_count, 1)
+        self.assertEqual(get_user_stats(self.reader).posts_count, 1)
+        self.assertEqual(search.search("Первый", 10)[0], post)
+        fresh = Post.objects.create(text="Новый", author=self.reader)
+        self.assertGreater(fresh.pub_date.year, 2016)
+
+    def test_rerun_skips_imported_rows(self):
+        self._write(
+            "groups",
+            [{"slug": "new", "title": "Новая"}, {"slug": "new"}],
+        )
+        self._write(
+            "posts",
+            [
+                {"id": 10, "text": "Первый", "author": "writer"},
+                {"id": 10, "text": "Повтор", "author": "writer"},
+            ],
+        )
+        self._write(
+            "comments",
+            [{"id": "c1", "post": 10, "text": "Да", "author": "reader"}],
+        )
+        self._write("follows", [{"user": "reader", "author": "writer"}])
+        for _ in range(2):
+            call_command("import_data", self.directory, stdout=StringIO())
+        post = Post.objects.get()
+        self.assertEqual(post.text, "Первый")
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Group.objects.get(slug="new").title, "Новая")
+        self.assertEqual(get_user_stats(post.author).posts_count, 1)
+        self.assertEqual(get_user_stats(post.author).followers_count, 1)
+        self.assertEqual(self.reader.timeline.count(), 1)
+
+    def test_interrupted_maintenance_finished_by_rerun(self):
+        self._write(
+            "posts", [{"id": 1, "text": "Первый", "author": "writer"}]
+        )
+        self._write("follows", [{"user": "reader", "author": "writer"}])
+        with mock.patch.object(
+            import_data.Command, "_maintain", side_effect=KeyboardInterrupt
+        ):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command("import_data", self.directory, stdout=StringIO())
+        self.assertEqual(self.reader.timeline.count(), 0)
+        call_command("import_data", self.directory, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(self.reader.timeline.count(), 1)
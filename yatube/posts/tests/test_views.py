@@ -1,16 +1,45 @@
+import os
 import random
 import shutil
 import tempfile
+from datetime import datetime
+from io import StringIO
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.paginator import EmptyPage
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
+from core import singleflight
+
+from .. import (
+    fragments,
+    groups,
+    pagecache,
+    paginator,
+    search,
+    sitemaps,
+    thumbnails,
+    variants,
+)
 from ..forms import PostForm
-from ..models import Comment, Follow, Group, Post
+from ..models import (
+    Comment,
+    Follow,
+    Group,
+    ImageVariant,
+    Post,
+    TimelineEntry,
+)
 
 User = get_user_model()
 NEW_POSTS = random.randrange(
@@ -192,15 +221,232 @@ class PostViewsTests(TestCase):
         )
 
     def test_index_caches(self):
-        """Страница index кешируется."""
+        """Страница index кешируется до изменения постов."""
         response = self.authorized_client.get(reverse("posts:index"))
-        Post.objects.all().delete()
+        Post.objects.update(text="Изменено в обход сигналов")
         response_1 = self.authorized_client.get(reverse("posts:index"))
-        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.get(pk=self.post.pk).delete()
         response_2 = self.authorized_client.get(reverse("posts:index"))
         self.assertEqual(response.content, response_1.content)
         self.assertNotEqual(response_1.content, response_2.content)
 
+    def test_new_post_invalidates_fragments(self):
+        """Новый пост сразу появляется на закешированных страницах."""
+        urls = (
+            reverse("posts:index"),
+            reverse("posts:group_list", kwargs={"slug": self.group.slug}),
+            reverse("posts:profile", kwargs={"username": self.user}),
+        )
+        for url in urls:
+            self.guest_client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(
+                text="Свежий пост", author=self.user, group=self.group
+            )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, "Свежий пост")
+
+    def test_versions_bumped_after_commit(self):
+        """Версии областей меняются только после фиксации транзакции."""
+        before = fragments.get_version("index", f"author:{self.user.pk}")
+        with self.captureOnCommitCallbacks() as callbacks:
+            Post.objects.create(text="Ещё не зафиксирован", author=self.user)
+            self.assertEqual(
+                fragments.get_version("index", f"author:{self.user.pk}"),
+                before,
+            )
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(
+            fragments.get_version("index", f"author:{self.user.pk}"), before
+        )
+
+    def test_comment_invalidates_post_detail(self):
+        """Новый комментарий сразу виден на странице поста."""
+        url = reverse("posts:post_detail", kwargs={"post_id": self.post.id})
+        self.guest_client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(
+                post=self.post,
+                author=self.follower,
+                text="Свежий комментарий",
+            )
+        self.assertContains(self.guest_client.get(url), "Свежий комментарий")
+
+    def test_anonymous_page_cache(self):
+        """Страница поста для гостя берётся из кеша до нового
+        комментария."""
+        url = reverse("posts:post_detail", kwargs={"post_id": self.post.id})
+        self.assertEqual(self.guest_client.get(url)["X-Cache"], "MISS")
+        self.assertEqual(self.guest_client.get(url)["X-Cache"], "HIT")
+        self.assertFalse(
+            self.authorized_client.get(url).has_header("X-Cache")
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.authorized_client.post(
+                reverse("posts:add_comment", kwargs={"post_id": self.post.id}),
+                data={"text": "Комментарий для гостя"},
+            )
+        response = self.guest_client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertContains(response, "Комментарий для гостя")
+        self.assertEqual(
+            pagecache.stats(), {"hits": 1, "misses": 1, "stale": 1}
+        )
+
+    def test_page_cache_ignores_unknown_params(self):
+        """Параметры, которые представление не читает, не дробят кеш."""
+        url = reverse("posts:index")
+        self.guest_client.get(url)
+        response = self.guest_client.get(url, {"utm_source": "mail"})
+        self.assertEqual(response["X-Cache"], "HIT")
+        response = self.guest_client.get(url, {"page": 1})
+        self.assertEqual(response["X-Cache"], "MISS")
+
+    def test_profile_cache_follows_author_subscriptions(self):
+        """Подписка автора сбрасывает его профиль в кеше гостей."""
+        url = reverse("posts:profile", kwargs={"username": self.user})
+        self.assertContains(self.guest_client.get(url), "подписок: 0")
+        other = User.objects.create_user(username="other")
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(user=self.user, author=other)
+        response = self.guest_client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertContains(response, "подписок: 1")
+
+    def test_change_during_render_leaves_page_stale(self):
+        """Изменение во время рендера не сохраняется под новой версией."""
+        url = reverse("posts:index")
+        attach = groups.attach
+
+        def attach_and_bump(posts):
+            fragments.bump("index")
+            return attach(posts)
+
+        with mock.patch.object(groups, "attach", attach_and_bump):
+            self.guest_client.get(url)
+        self.assertEqual(self.guest_client.get(url)["X-Cache"], "MISS")
+
+    def test_stale_page_served_while_recomputed(self):
+        """Пока устаревшую страницу пересчитывает другой процесс,
+        гость получает её старую копию."""
+        url = reverse("posts:index")
+        self.guest_client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(
+                text="Пост во время пересчёта", author=self.user
+            )
+        singleflight.acquire(pagecache.PAGE_KEY.format(url))
+        response = self.guest_client.get(url)
+        self.assertEqual(response["X-Cache"], "STALE")
+        self.assertNotContains(response, "Пост во время пересчёта")
+        self.assertEqual(singleflight.stats()["stale_serves"], 1)
+
+    def test_post_detail_queries_do_not_grow_with_comments(self):
+        """Число запросов post_detail не зависит от числа комментариев."""
+        url = reverse("posts:post_detail", kwargs={"post_id": self.post.id})
+        self.authorized_client.get(url)
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=user, text="Комментарий")
+            for user in (self.user, self.follower, self.follow_author) * 10
+        )
+        cache.clear()
+        # Сессия, пользователь, пост с автором и группой, комментарии
+        # с авторами, варианты картинки, миниатюра.
+        with self.assertNumQueries(6):
+            self.authorized_client.get(url)
+
+    def test_post_detail_comments_paginated(self):
+        """На странице поста только первая порция комментариев,
+        остальные отдаются отдельным запросом."""
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.follower, text=f"К {i}")
+            for i in range(settings.NUMBER_COMMENTS + 5)
+        )
+        response = self.guest_client.get(
+            reverse("posts:post_detail", kwargs={"post_id": self.post.id})
+        )
+        comments = response.context["comments"]
+        self.assertEqual(len(comments), settings.NUMBER_COMMENTS)
+        more_url = reverse(
+            "posts:comments_more", kwargs={"post_id": self.post.id}
+        )
+        response = self.guest_client.get(
+            more_url, {"after": comments.next_cursor, "format": "json"}
+        )
+        data = response.json()
+        self.assertEqual(len(data["comments"]), 5)
+        self.assertIsNone(data["next"])
+        response = self.guest_client.get(
+            more_url, {"after": comments.next_cursor}
+        )
+        self.assertTemplateUsed(response, "includes/comment_list.html")
+        self.assertEqual(len(response.context["comments"]), 5)
+
+    def test_comments_more_unknown_post(self):
+        response = self.guest_client.get(
+            reverse("posts:comments_more", kwargs={"post_id": 10**6})
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_thumbnails_built_after_commit(self):
+        """Миниатюры и варианты ставятся в очередь после сохранения
+        поста, а до их готовности шаблон показывает исходную картинку."""
+        uploaded = SimpleUploadedFile(
+            name="thumb.gif", content=self.image_png, content_type="image/gif"
+        )
+        with mock.patch.object(
+            thumbnails, "schedule"
+        ) as schedule, self.captureOnCommitCallbacks(execute=True):
+            self.authorized_client.post(
+                reverse("posts:post_create"),
+                data={"text": "Пост с картинкой", "image": uploaded},
+            )
+        post = Post.objects.get(text="Пост с картинкой")
+        schedule.assert_called_once_with(post.image.name)
+        self.assertIsNone(thumbnails.lookup(post.image, "960x339"))
+        url = reverse("posts:post_detail", kwargs={"post_id": post.id})
+        self.assertContains(self.guest_client.get(url), post.image.url)
+        with self.settings(THUMBNAIL_WORKERS=0):
+            thumbnails.schedule(post.image.name)
+        thumbnail = thumbnails.lookup(post.image, "960x339")
+        self.assertIsNotNone(thumbnail)
+        response = self.guest_client.get(url)
+        self.assertContains(response, thumbnail.url)
+        self.assertEqual(
+            ImageVariant.objects.filter(source=post.image.name).count(),
+            len(variants.WIDTHS) * len(variants.FORMATS),
+        )
+        self.assertContains(response, 'type="image/webp"')
+
+    def _index_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(reverse("posts:index"))
+        return len(queries)
+
+    def test_feed_images_prefetched_in_one_batch(self):
+        """Миниатюры и srcset картинок ленты ищутся одной пачкой
+        на страницу, а не отдельно для каждого поста."""
+        with self.settings(THUMBNAIL_WORKERS=0):
+            thumbnails.generate(self.post.image.name)
+        single = self._index_queries()
+        for number in range(3):
+            Post.objects.create(
+                text=f"Картинка {number}",
+                author=self.user,
+                image=SimpleUploadedFile(
+                    f"{number}.gif", self.image_png + bytes([number])
+                ),
+            )
+        self.assertEqual(self._index_queries(), single)
+        response = self.guest_client.get(reverse("posts:index"))
+        thumbnail = thumbnails.lookup(self.post.image, "960x339")
+        self.assertContains(response, thumbnail.url)
+
     def test_follow_index_1(self):
         """Новая запись пользователя появляется в ленте тех,
         кто на него подписан."""
@@ -234,6 +480,40 @@ class PostViewsTests(TestCase):
             "подписка на автора не оформлена",
         )
 
+    def test_follow_index_timeline(self):
+        """Лента подписок пополняется новыми постами и чистится
+        после отписки."""
+        self.client_follower.get(
+            reverse("posts:profile_follow", kwargs={"username": self.user})
+        )
+        new_post = Post.objects.create(text="Новый пост", author=self.user)
+        response = self.client_follower.get(reverse("posts:follow_index"))
+        self.assertEqual(
+            list(response.context["page_obj"]), [new_post, self.post]
+        )
+        self.client_follower.get(
+            reverse("posts:profile_unfollow", kwargs={"username": self.user})
+        )
+        response = self.client_follower.get(reverse("posts:follow_index"))
+        self.assertEqual(len(response.context["page_obj"]), 0)
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.follower).exists()
+        )
+
+    def test_rebuild_timelines(self):
+        """Команда rebuild_timelines восстанавливает ленты подписок."""
+        Follow.objects.create(user=self.follower, author=self.user)
+        Follow.objects.create(user=self.user, author=self.follower)
+        TimelineEntry.objects.all().delete()
+        # Точка сохранения, очистка, INSERT ... SELECT, её освобождение.
+        with self.assertNumQueries(4):
+            call_command("rebuild_timelines", stdout=StringIO())
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.follower, post=self.post
+            ).exists()
+        )
+
 
 class PaginatorViewsTest(TestCase):
     @classmethod
@@ -252,6 +532,7 @@ class PaginatorViewsTest(TestCase):
         cls.post = Post.objects.bulk_create(posts)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
 
     def test_first_page_index(self):
@@ -311,3 +592,712 @@ class PaginatorViewsTest(TestCase):
         self.assertEqual(
             len(response.context["page_obj"]), POSTS_ON_SECOND_PAGE
         )
+
+    def test_cursor_pages_index(self):
+        """Курсорная пагинация листает ленту вперёд и назад."""
+        response = self.guest_client.get(reverse("posts:index"))
+        first_page = response.context["page_obj"]
+        self.assertFalse(first_page.has_previous())
+        self.assertTrue(first_page.has_next())
+        response = self.guest_client.get(
+            reverse("posts:index") + f"?after={first_page.next_cursor}"
+        )
+        second_page = response.context["page_obj"]
+        self.assertEqual(len(second_page), POSTS_ON_SECOND_PAGE)
+        self.assertFalse(second_page.has_next())
+        self.assertTrue(
+            set(first_page).isdisjoint(second_page),
+            "страницы ленты не должны пересекаться",
+        )
+        response = self.guest_client.get(
+            reverse("posts:index") + f"?before={second_page.previous_cursor}"
+        )
+        self.assertEqual(
+            list(response.context["page_obj"]), list(first_page)
+        )
+
+    def test_cursor_page_without_count(self):
+        """Курсорная страница выбирается одним запросом без COUNT."""
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(reverse("posts:index"))
+        self.assertEqual(
+            len(response.context["page_obj"]), settings.NUMBER_POSTS
+        )
+
+    def test_broken_cursor_returns_first_page(self):
+        response = self.guest_client.get(
+            reverse("posts:index") + "?after=broken"
+        )
+        self.assertEqual(
+            len(response.context["page_obj"]), settings.NUMBER_POSTS
+        )
+
+    def test_out_of_range_cursor_returns_first_page(self):
+        now = timezone.now()
+        for pk in (10**20, 2**63, 0, -1):
+            cursor = paginator.encode_cursor((now, pk))
+            self.assertIsNone(paginator.decode_cursor(cursor))
+            for name in ("after", "before"):
+                response = self.guest_client.get(
+                    reverse("posts:index"), {name: cursor}
+                )
+                self.assertEqual(
+                    len(response.context["page_obj"]), settings.NUMBER_POSTS
+                )
+
+    def test_naive_cursor_date_is_made_aware(self):
+        cursor = paginator.encode_cursor((datetime(2100, 1, 1), 1))
+        date, _ = paginator.decode_cursor(cursor)
+        self.assertTrue(timezone.is_aware(date))
+        response = self.guest_client.get(
+            reverse("posts:index"), {"after": cursor}
+        )
+        self.assertEqual(
+            len(response.context["page_obj"]), settings.NUMBER_POSTS
+        )
+
+
+def staff_only(request, path):
+    return request.user.is_staff
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, MEDIA_ACCEL="")
+class MediaServeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="auth")
+        cls.content = bytes(range(256)) * 4
+        cls.post = Post.objects.create(
+            text="Пост с картинкой",
+            author=cls.user,
+            image=SimpleUploadedFile("data.gif", cls.content),
+        )
+
+    def setUp(self):
+        self.url = self.post.image.url
+
+    def test_full_file_with_validators(self):
+        response = self.client.get(self.url)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+        self.assertEqual(response["Content-Type"], "image/gif")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertIn("ETag", response)
+        self.assertIn("Last-Modified", response)
+
+    def test_not_modified(self):
+        """Повторный запрос с валидаторами получает 304 без тела."""
+        response = self.client.get(self.url)
+        for headers in (
+            {"HTTP_IF_NONE_MATCH": response["ETag"]},
+            {"HTTP_IF_MODIFIED_SINCE": response["Last-Modified"]},
+        ):
+            response = self.client.get(self.url, **headers)
+            self.assertEqual(response.status_code, 304)
+
+    def test_range(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(
+            b"".join(response.streaming_content), self.content[10:20]
+        )
+        self.assertEqual(
+            response["Content-Range"], f"bytes 10-19/{len(self.content)}"
+        )
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-5")
+        self.assertEqual(
+            b"".join(response.streaming_content), self.content[-5:]
+        )
+        response = self.client.get(self.url, HTTP_RANGE="bytes=5000-")
+        self.assertEqual(response.status_code, 416)
+
+    def test_malformed_range_returns_full_file(self):
+        """Диапазон с концом раньше начала игнорируется."""
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-5")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+
+    def test_stale_if_range_returns_full_file(self):
+        response = self.client.get(
+            self.url, HTTP_RANGE="bytes=10-19", HTTP_IF_RANGE='"old"'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_offload_to_web_server(self):
+        """С MEDIA_ACCEL байты отдаёт веб-сервер, а Django только
+        заголовки."""
+        name = self.post.image.name
+        with self.settings(MEDIA_ACCEL="nginx"):
+            response = self.client.get(self.url)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(
+            response["X-Accel-Redirect"], f"/protected-media/{name}"
+        )
+        with self.settings(MEDIA_ACCEL="sendfile"):
+            response = self.client.get(self.url)
+        self.assertEqual(response["X-Sendfile"], self.post.image.path)
+
+    def test_offload_quotes_path(self):
+        name = self.post.image.storage._save(
+            "posts/кот и пёс.gif", ContentFile(self.content)
+        )
+        with self.settings(MEDIA_ACCEL="nginx"):
+            response = self.client.get(f"/media/{name}")
+        self.assertEqual(
+            response["X-Accel-Redirect"],
+            "/protected-media/posts/%D0%BA%D0%BE%D1%82%20%D0%B8%20"
+            "%D0%BF%D1%91%D1%81.gif",
+        )
+
+    @override_settings(
+        MEDIA_ACCESS_CHECK="posts.tests.test_views.staff_only"
+    )
+    def test_access_check(self):
+        """Функция из MEDIA_ACCESS_CHECK решает, кому отдать файл."""
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        staff = User.objects.create_user(username="staff", is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_hidden_and_missing_files(self):
+        self.assertEqual(self.client.get("/media/.env").status_code, 403)
+        self.assertEqual(
+            self.client.get("/media/posts/missing.gif").status_code, 404
+        )
+
+
+class PostSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="auth")
+        cls.in_text = Post.objects.create(
+            text="Рецепт борща <b>со сметаной</b>", author=cls.user
+        )
+        cls.in_comment = Post.objects.create(
+            text="Что приготовить на ужин?", author=cls.user
+        )
+        Comment.objects.create(
+            post=cls.in_comment, author=cls.user, text="Сварите борщ"
+        )
+
+    def _search(self, query, **params):
+        response = self.client.get(
+            reverse("posts:post_search"), {"q": query, **params}
+        )
+        return response.context["page_obj"]
+
+    def test_ranked_results_from_posts_and_comments(self):
+        """Совпадение в тексте поста выше совпадения в комментарии."""
+        self.assertEqual(
+            list(self._search("борщ")), [self.in_text, self.in_comment]
+        )
+        self.assertEqual(list(self._search("сметаной борщ")), [self.in_text])
+        self.assertEqual(list(self._search("!!!")), [])
+
+    def test_snippet_is_escaped(self):
+        response = self.client.get(
+            reverse("posts:post_search"), {"q": "сметаной"}
+        )
+        self.assertContains(response, "&lt;b&gt;со <mark>сметаной</mark>")
+
+    def test_index_follows_edits_and_deletes(self):
+        self.in_text.text = "Рецепт солянки"
+        self.in_text.save()
+        self.assertEqual(list(self._search("борщ")), [self.in_comment])
+        Comment.objects.filter(post=self.in_comment).delete()
+        self.assertEqual(list(self._search("борщ")), [])
+        self.assertEqual(list(self._search("солянки")), [self.in_text])
+        Post.objects.filter(pk=self.in_text.pk).delete()
+        self.assertEqual(list(self._search("солянки")), [])
+
+    def test_best_match_ranked_among_all_matches(self):
+        """Старый пост с лучшим совпадением не теряется за тысячей
+        новых."""
+        best = Post.objects.create(
+            text="Борщ, борщ и ещё раз борщ", author=self.user
+        )
+        Post.objects.bulk_create(
+            Post(text=f"Про борщ и другие супы {number}", author=self.user)
+            for number in range(1001)
+        )
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(self._search("борщ")[0], best)
+
+    def test_comment_indexed_as_own_row(self):
+        comment = Comment.objects.create(
+            post=self.in_text, author=self.user, text="Добавьте укроп"
+        )
+        self.assertEqual(list(self._search("укроп")), [self.in_text])
+        self.assertIn("<mark>укроп</mark>", self._search("укроп")[0].snippet)
+        comment.delete()
+        self.assertEqual(list(self._search("укроп")), [])
+
+    def _post_with_comments(self, count):
+        post = Post.objects.create(text="Обсуждение", author=self.user)
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.user, text=f"Мнение {number}")
+            for number in range(count)
+        )
+        call_command("rebuild_search_index", stdout=StringIO())
+        return post
+
+    def test_post_delete_skips_per_comment_work(self):
+        """Удаление поста не делает запросов на каждый комментарий и
+        убирает комментарии из индекса."""
+        post = self._post_with_comments(10)
+        with CaptureQueriesContext(connection) as context:
+            with self.captureOnCommitCallbacks(execute=True):
+                post.delete()
+        # Django удаляет комментарии пачками по 100 id.
+        post = self._post_with_comments(100)
+        with self.assertNumQueries(len(context)):
+            with self.captureOnCommitCallbacks(execute=True):
+                post.delete()
+        self.assertEqual(list(self._search("мнение")), [])
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {search.COMMENT_TABLE}")
+            self.assertEqual(cursor.fetchone(), (1,))
+
+    def test_keyset_pages(self):
+        Post.objects.bulk_create(
+            Post(text=f"Борщ номер {number}", author=self.user)
+            for number in range(settings.NUMBER_POSTS)
+        )
+        call_command("rebuild_search_index", stdout=StringIO())
+        first = self._search("борщ")
+        self.assertEqual(len(first), settings.NUMBER_POSTS)
+        second = self._search("борщ", after=first.next_cursor)
+        self.assertEqual(len(second), 2)
+        self.assertFalse(second.has_next())
+        self.assertFalse(set(first) & set(second))
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "a@a.ru", "pass")
+        cls.group = Group.objects.create(title="Группа", slug="group")
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _add_rows(self, count):
+        start = User.objects.count()
+        for number in range(start, start + count):
+            author = User.objects.create_user(username=f"author_{number}")
+            post = Post.objects.create(
+                text=f"Пост {number}", author=author, group=self.group
+            )
+            Comment.objects.create(post=post, author=author, text="Текст")
+            Follow.objects.create(user=self.admin, author=author)
+
+    def _queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_rows(self):
+        """Число запросов на страницу списка не зависит от числа
+        строк на ней."""
+        urls = [
+            reverse(f"admin:posts_{model}_changelist")
+            for model in ("post", "comment", "follow")
+        ]
+        self._add_rows(2)
+        before = [self._queries(url) for url in urls]
+        self._add_rows(8)
+        self.assertEqual([self._queries(url) for url in urls], before)
+
+    def test_post_changelist_uses_autocomplete(self):
+        self._add_rows(3)
+        response = self.client.get(reverse("admin:posts_post_changelist"))
+        self.assertContains(
+            response, 'data-theme="admin-autocomplete"', count=3
+        )
+        self.assertContains(
+            response, f'<option value="{self.group.pk}" selected>', count=3
+        )
+
+    def test_search_keeps_substring_semantics(self):
+        """Поиск в админке — icontains по тексту самой записи."""
+        self._add_rows(3)
+        for model, query, count in (
+            ("post", "ост", 3),
+            ("post", "Текст", 0),
+            ("comment", "екс", 3),
+        ):
+            with self.subTest(model=model, query=query):
+                response = self.client.get(
+                    reverse(f"admin:posts_{model}_changelist"), {"q": query}
+                )
+                self.assertEqual(response.context["cl"].result_count, count)
+
+    def test_capped_count_label_and_paging(self):
+        """Отфильтрованный список больше COUNT_LIMIT подписан «N+» и
+        листается дальше границы подсчёта."""
+        self._add_rows(7)
+        url = reverse("admin:posts_post_changelist")
+        with mock.patch.object(paginator, "COUNT_LIMIT", 3):
+            response = self.client.get(url, {"q": "Пост"})
+            self.assertContains(response, "3+")
+            pages = paginator.EstimatedCountPaginator(
+                Post.objects.filter(text__contains="Пост").order_by("pk"), 2
+            )
+            self.assertEqual(str(pages.count), "3+")
+            self.assertEqual(len(pages.page(3)), 2)
+            self.assertEqual(pages.num_pages, 4)
+            self.assertEqual(len(pages.page(4)), 1)
+            self.assertEqual(pages.num_pages, 4)
+            with self.assertRaises(EmptyPage):
+                pages.page(5)
+
+    def test_estimated_count_for_large_tables(self):
+        """Без фильтров число строк берётся из оценки, а не COUNT(*)."""
+        self._add_rows(1)
+        url = reverse("admin:posts_post_changelist")
+        with mock.patch.object(paginator, "COUNT_LIMIT", 0):
+            with mock.patch.object(
+                paginator, "estimate_count", return_value=10**6
+            ):
+                response = self.client.get(url)
+        self.assertEqual(response.context["cl"].result_count, 10**6)
+
+
+class GroupCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="auth")
+        cls.group = Group.objects.create(title="Группа", slug="group")
+        Post.objects.create(text="Пост", author=cls.user, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def _group_queries(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        return [
+            query["sql"]
+            for query in queries
+            if Group._meta.db_table in query["sql"]
+        ]
+
+    def test_hot_paths_do_not_query_groups(self):
+        """Страница группы, лента и форма поста берут группы из кеша."""
+        url = reverse("posts:group_list", kwargs={"slug": self.group.slug})
+        self.client.get(url)
+        for url in (url, reverse("posts:index")):
+            self.assertEqual(
+                self._group_queries(lambda: self.client.get(url)), []
+            )
+        with self.assertNumQueries(0):
+            self.assertIn(self.group.title, PostForm().as_p())
+        form = PostForm(data={"text": "Текст", "group": self.group.pk})
+        # При сохранении модель сама проверяет, что группа ещё есть.
+        with self.assertNumQueries(1):
+            self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data["group"], self.group)
+
+    def test_unknown_group_rejected(self):
+        form = PostForm(data={"text": "Текст", "group": self.group.pk + 1})
+        self.assertFalse(form.is_valid())
+        self.assertIn("group", form.errors)
+
+    def test_save_invalidates_process_cache(self):
+        groups.get(self.group.pk)
+        self.group.title = "Новое название"
+        self.group.save()
+        self.assertEqual(groups.get(self.group.pk).title, "Новое название")
+        response = self.client.get(
+            reverse("posts:group_list", kwargs={"slug": self.group.slug})
+        )
+        self.assertContains(response, "Новое название")
+
+    def test_other_process_change_seen_after_check_interval(self):
+        """Изменение из другого процесса видно после сверки версии."""
+        groups.get(self.group.pk)
+        Group.objects.filter(pk=self.group.pk).update(title="Другое")
+        fragments.bump(groups.SCOPE)
+        with override_settings(GROUP_CACHE_CHECK_INTERVAL=60):
+            self.assertEqual(groups.get(self.group.pk).title, "Группа")
+        with override_settings(GROUP_CACHE_CHECK_INTERVAL=0):
+            self.assertEqual(groups.get(self.group.pk).title, "Другое")
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(title="Группа", slug="group")
+        for number in range(settings.NUMBER_POSTS + 2):
+            Post.objects.create(
+                text=f"Пост {number}", author=cls.author, group=cls.group
+            )
+        cls.post = Post.objects.latest("pk")
+        Comment.objects.create(post=cls.post, author=cls.reader, text="Да")
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds_paginated_by_cursor(self):
+        urls = [
+            reverse("posts:api_index"),
+            reverse("posts:api_group", kwargs={"slug": self.group.slug}),
+            reverse(
+                "posts:api_profile",
+                kwargs={"username": self.author.username},
+            ),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                data = self.client.get(url).json()
+                self.assertEqual(len(data["results"]), settings.NUMBER_POSTS)
+                self.assertEqual(
+                    data["results"][0],
+                    {
+                        "id": self.post.pk,
+                        "text": self.post.text,
+                        "pub_date": data["results"][0]["pub_date"],
+                        "author": "author",
+                        "group": "group",
+                        "image": None,
+                    },
+                )
+                rest = self.client.get(url, {"after": data["next"]}).json()
+                self.assertEqual(len(rest["results"]), 2)
+                self.assertIsNone(rest["next"])
+
+    def test_not_modified_without_queries(self):
+        url = reverse("posts:api_index")
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(text="Новый", author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_post_detail_with_comments(self):
+        url = reverse("posts:api_post", kwargs={"post_id": self.post.pk})
+        response = self.client.get(url)
+        data = response.json()
+        self.assertEqual(data["comments_count"], 1)
+        self.assertEqual(data["comments"]["results"][0]["text"], "Да")
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(
+                post=self.post, author=self.reader, text="Ещё"
+            )
+        response = self.client.get(
+            url, HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.json()["comments_count"], 2)
+        missing = reverse("posts:api_post", kwargs={"post_id": 10**6})
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+    def test_follow_feed_requires_login(self):
+        url = reverse("posts:api_follow")
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(self.reader)
+        data = self.client.get(url).json()
+        self.assertEqual(data["results"][0]["id"], self.post.pk)
+
+
+class FeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username="author")
+        cls.group = Group.objects.create(title="Группа", slug="group")
+        for number in range(settings.NUMBER_FEED_ITEMS + 1):
+            Post.objects.create(
+                text=f"Пост номер {number}",
+                author=cls.author,
+                group=cls.group,
+            )
+        Post.objects.create(text="Без группы", author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds(self):
+        urls = {
+            reverse("posts:feed_rss"): "Без группы",
+            reverse("posts:feed_atom"): "Без группы",
+            reverse("posts:group_rss", args=("group",)): "Группа",
+            reverse("posts:group_atom", args=("group",)): "Группа",
+            reverse("posts:profile_rss", args=("author",)): "author",
+            reverse("posts:profile_atom", args=("author",)): "author",
+        }
+        for url, text in urls.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, text)
+                self.assertTrue(response.has_header("Last-Modified"))
+                tag = "<entry>" if "atom" in url else "<item>"
+                self.assertEqual(
+                    response.content.decode().count(tag),
+                    settings.NUMBER_FEED_ITEMS,
+                )
+        missing = reverse("posts:group_rss", args=("missing",))
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+    def test_conditional_requests(self):
+        url = reverse("posts:group_rss", args=("group",))
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response["ETag"]
+            )
+        self.assertEqual(not_modified.status_code, 304)
+        not_modified = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_feeds_share_page_scopes(self):
+        """Лента устаревает вместе со страницей того же объекта."""
+        for feed, page in (
+            (reverse("posts:feed_rss"), reverse("posts:index")),
+            (
+                reverse("posts:group_rss", args=("group",)),
+                reverse("posts:group_list", args=("group",)),
+            ),
+            (
+                reverse("posts:profile_rss", args=("author",)),
+                reverse("posts:profile", args=("author",)),
+            ),
+        ):
+            with self.subTest(feed=feed):
+                self.assertEqual(
+                    self.client.get(feed)[pagecache.SURROGATE_HEADER],
+                    self.client.get(page)[pagecache.SURROGATE_HEADER],
+                )
+
+    def test_cached_until_new_post(self):
+        url = reverse("posts:feed_rss")
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(text="Свежий пост", author=self.author)
+        self.assertContains(self.client.get(url), "Свежий пост")
+
+
+class SitemapTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username="author")
+        User.objects.create_user(username="silent")
+        cls.group = Group.objects.create(title="Группа", slug="group")
+        cls.posts = [
+            Post.objects.create(text=f"Пост {number}", author=cls.author)
+            for number in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_index_lists_shards(self):
+        with mock.patch.object(sitemaps.ShardedSitemap, "limit", 2):
+            response = self.client.get(reverse("sitemap"))
+        self.assertEqual(response["Content-Type"], "application/xml")
+        last = -(-self.posts[-1].pk // 2)
+        for section, page in (
+            ("posts", 1),
+            ("posts", last),
+            ("profiles", 1),
+            ("groups", 1),
+        ):
+            self.assertContains(
+                response,
+                f"http://testserver/sitemap-{section}-{page}.xml",
+            )
+        self.assertNotContains(response, f"sitemap-posts-{last + 1}.xml")
+
+    def test_index_skips_empty_shards(self):
+        with mock.patch.object(sitemaps.ShardedSitemap, "limit", 2):
+            shard = -(-self.posts[2].pk // 2)
+            Post.objects.filter(
+                pk__gt=(shard - 1) * 2, pk__lte=shard * 2
+            ).delete()
+            response = self.client.get(reverse("sitemap"))
+            self.assertNotContains(response, f"sitemap-posts-{shard}.xml")
+            self.assertContains(
+                response, f"sitemap-posts-{shard + 1}.xml"
+            )
+        # Откат транзакции теста не сбросит кеш групп процесса.
+        self.addCleanup(groups.invalidate)
+        Group.objects.all().delete()
+        self.assertNotIn(
+            "groups", {section for section, _ in sitemaps.shards()}
+        )
+
+    def test_cache_survives_post_edit(self):
+        urls = (
+            reverse("sitemap"),
+            reverse("sitemap_section", args=("posts", 1)),
+        )
+        for url in urls:
+            self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            post = self.posts[0]
+            post.text = "Правка"
+            post.save()
+        for url in urls:
+            self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(text="Новый", author=self.author)
+        for url in urls:
+            self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+
+    def test_shards_split_by_primary_key(self):
+        deleted = self.posts[1]
+        page = -(-deleted.pk // 2)
+        deleted.delete()
+        with mock.patch.object(sitemaps.ShardedSitemap, "limit", 2):
+            url = reverse("sitemap_section", args=("posts", page))
+            # Наибольший pk и диапазон строк части.
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            missing = reverse("sitemap_section", args=("posts", 100))
+            self.assertEqual(self.client.get(missing).status_code, 404)
+        self.assertEqual(response.content.decode().count("<url>"), 1)
+        profiles = self.client.get(
+            reverse("sitemap_section", args=("profiles", 1))
+        )
+        self.assertContains(profiles, "/profile/author/")
+        self.assertNotContains(profiles, "/profile/silent/")
+        groups_map = self.client.get(
+            reverse("sitemap_section", args=("groups", 1))
+        )
+        self.assertContains(groups_map, "/group/group/")
+
+    def test_render_sitemaps(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for name in ("sitemap-posts-9.xml", "sitemap-style.xsl"):
+            open(os.path.join(directory, name), "w").close()
+        call_command(
+            "render_sitemaps",
+            directory,
+            base_url="https://testserver",
+            stdout=StringIO(),
+        )
+        self.assertEqual(
+            sorted(os.listdir(directory)),
+            [
+                "sitemap-groups-1.xml",
+                "sitemap-posts-1.xml",
+                "sitemap-profiles-1.xml",
+                "sitemap-style.xsl",
+                "sitemap.xml",
+            ],
+        )
+        with open(os.path.join(directory, "sitemap.xml")) as file:
+            self.assertIn(
+                "https://testserver/sitemap-posts-1.xml", file.read()
+            )
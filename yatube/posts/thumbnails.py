@@ -0,0 +1,174 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+Миниатюры всех размеров из SIZES и адаптивные варианты из variants
+строятся в пуле потоков после сохранения поста, а шаблоны только
+читают готовый результат и, пока его нет, показывают исходную
+картинку. Когда миниатюры готовы, версии областей постов с этой
+картинкой увеличиваются, и закешированные страницы перестраиваются.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import fragments, variants
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Размеры, которые используют шаблоны постов.
+SIZES = {
+    "960x339": {"crop": "center", "upscale": True},
+}
+
+_executor = None
+
+
+class LookupBackend(ThumbnailBackend):
+    """Бэкенд sorl, который умеет искать миниатюру без её генерации."""
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        # Повторяет нормализацию опций из ThumbnailBackend.get_thumbnail,
+        # чтобы имя миниатюры совпало с тем, что строит sorl.
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault("format", self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+
+backend = LookupBackend()
+
+
+def source(name):
+    """Картинка поста по имени в том хранилище, где она лежит."""
+    return ImageFile(name, Post._meta.get_field("image").storage)
+
+
+def lookup(image, geometry):
+    """Возвращает готовую миниатюру или None, ничего не генерируя."""
+    thumbnail = backend.thumbnail_file(image, geometry, **SIZES[geometry])
+    return default.kvstore.get(thumbnail)
+
+
+def _get_many_raw(keys):
+    """Читает сырые значения sorl одной пачкой: кеш, затем база."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(
+            KVStoreModel.objects.filter(key__in=missing).values_list(
+                "key", "value"
+            )
+        )
+        # Как и cached_db KVStore, запоминаем отсутствие ключа в кеше.
+        fetched = {
+            key: found.get(key, cached_db_kvstore.EMPTY_VALUE)
+            for key in missing
+        }
+        kvstore.cache.set_many(
+            fetched, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+        values.update(fetched)
+    return {
+        key: None if value == cached_db_kvstore.EMPTY_VALUE else value
+        for key, value in values.items()
+    }
+
+
+def lookup_many(images, geometry):
+    """Как lookup, но для нескольких картинок за один поход в кеш:
+    {имя картинки: миниатюра или None}."""
+    keys = {
+        image.name: add_prefix(
+            backend.thumbnail_file(image, geometry, **SIZES[geometry]).key
+        )
+        for image in images
+    }
+    values = _get_many_raw(list(set(keys.values())))
+    return {
+        name: deserialize_image_file(values[key]) if values[key] else None
+        for name, key in keys.items()
+    }
+
+
+def known(names):
+    """Имена файлов миниатюр, о которых знает хранилище ключей sorl.
+
+    Файл в каталоге THUMBNAIL_PREFIX без такой записи ни один шаблон
+    уже не найдёт."""
+    keys = {
+        add_prefix(ImageFile(name, default.storage).key): name
+        for name in names
+    }
+    values = _get_many_raw(list(keys))
+    return {name for key, name in keys.items() if values[key]}
+
+
+def generate(name, force=False):
+    """Строит миниатюры всех размеров и адаптивные варианты картинки.
+
+    Одинаковые картинки хранятся одним файлом, поэтому готовые
+    варианты повторно не строятся, если не передан force.
+    """
+    for geometry, options in SIZES.items():
+        get_thumbnail(source(name), geometry, **options)
+    if force or not variants.exist(name):
+        variants.build(name)
+    _invalidate(name)
+
+
+def _invalidate(name):
+    """Сбрасывает кеш страниц, где картинка показана без миниатюр."""
+    scopes = {"index"}
+    for post_id, author_id, group_id in Post.objects.filter(
+        image=name
+    ).values_list("pk", "author_id", "group_id"):
+        scopes.update((f"post:{post_id}", f"author:{author_id}"))
+        if group_id:
+            scopes.add(f"group:{group_id}")
+    fragments.bump(*scopes)
+
+
+def _generate_in_background(name):
+    try:
+        generate(name)
+    except Exception:
+        logger.exception("Не удалось построить миниатюры для %s", name)
+    finally:
+        close_old_connections()
+
+
+def schedule(name):
+    """Ставит построение миниатюр в очередь фонового пула.
+
+    При THUMBNAIL_WORKERS = 0 миниатюры строятся сразу.
+    """
+    global _executor
+    if not settings.THUMBNAIL_WORKERS:
+        generate(name)
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix="thumbnails",
+        )
+    _executor.submit(_generate_in_background, name)
@@ -0,0 +1,92 @@
+"""Материализованные ленты подписок (fan-out on write).
+
+Каждая публикация раскладывается по лентам подписчиков автора,
+поэтому страница /follow/ читается одним диапазоном по индексу
+(user, pub_date) без соединения с таблицей подписок.
+"""
+from django.db import connection, transaction
+
+from .models import Follow, Post, TimelineEntry
+
+BATCH_SIZE = 1000
+
+
+def fan_out_post(post):
+    """Добавляет новый пост в ленты всех подписчиков автора."""
+    follower_ids = Follow.objects.filter(author_id=post.author_id).values_list(
+        "user_id", flat=True
+    )
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in follower_ids.iterator()
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Переносит в ленту пользователя посты нового автора."""
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        "id", "pub_date"
+    )
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts.iterator()
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты пользователя посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def _insert_select():
+    return (
+        f"INSERT INTO {TimelineEntry._meta.db_table}"
+        "(user_id, post_id, pub_date) "
+        "SELECT follow.user_id, post.id, post.pub_date "
+        f"FROM {Follow._meta.db_table} follow "
+        f"JOIN {Post._meta.db_table} post "
+        "ON post.author_id = follow.author_id"
+    )
+
+
+def fill(follow_ids, post_ids):
+    """Одним INSERT ... SELECT добавляет в ленты посты авторов новых
+    подписок и новые посты в ленты подписчиков.
+
+    follow_ids и post_ids — подзапросы (values() queryset). Записи,
+    которые уже есть в лентах, пропускаются. Возвращает число
+    добавленных записей.
+    """
+    follows, follow_params = follow_ids.order_by().query.sql_with_params()
+    posts, post_params = post_ids.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"{_insert_select()} "
+            f"WHERE (follow.id IN ({follows}) OR post.id IN ({posts})) "
+            "AND NOT EXISTS (SELECT 1 FROM "
+            f"{TimelineEntry._meta.db_table} entry "
+            "WHERE entry.user_id = follow.user_id "
+            "AND entry.post_id = post.id)",
+            (*follow_params, *post_params),
+        )
+        return cursor.rowcount
+
+
+@transaction.atomic
+def rebuild_all():
+    """Пересобирает все ленты с нуля одним INSERT ... SELECT,
+    возвращает число записей."""
+    TimelineEntry.objects.all().delete()
+    with connection.cursor() as cursor:
+        cursor.execute(_insert_select())
+        return cursor.rowcount
@@ -0,0 +1,94 @@
+"""Приём картинок постов с ограниченным расходом памяти.
+
+Размеры проверяются по заголовку файла без декодирования пикселей,
+JPEG декодируется сразу в уменьшенном масштабе, а результат без EXIF
+пишется во временный файл, который хранилище сохраняет потоково.
+Анимации пересобираются кадр за кадром без метаданных, но не
+уменьшаются.
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from PIL import Image, ImageOps, ImageSequence
+
+FORMATS = {"JPEG", "PNG", "GIF", "WEBP"}
+# Снимки телефонов с несколькими кадрами (MPO) — это JPEG, первый кадр
+# которого и есть фотография.
+ALIASES = {"MPO": "JPEG"}
+
+
+def _check_size(image):
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            "Картинка слишком большая: %(width)s×%(height)s пикселей.",
+            code="image_too_large",
+            params={"width": width, "height": height},
+        )
+
+
+def _strip_animated(image):
+    """Пересобирает анимированный GIF или WebP без EXIF, XMP и
+    комментариев, сохраняя длительность кадров и число повторов."""
+    durations = []
+    for frame in ImageSequence.Iterator(image):
+        # WebP отдаёт длительность кадра только после его декодирования.
+        frame.load()
+        durations.append(frame.info.get("duration", 0))
+    options = {"save_all": True, "duration": durations, "comment": b""}
+    if "loop" in image.info:
+        options["loop"] = image.info["loop"]
+    result = tempfile.TemporaryFile()
+    image.save(result, image.format, **options)
+    return result
+
+
+def _resize(image, fmt, max_side):
+    scale = max_side / max(image.size)
+    if fmt == "JPEG" and scale < 1:
+        # Декодер JPEG сразу уменьшает картинку в 2–8 раз, но не
+        # меньше целевого размера.
+        width, height = image.size
+        image.draft("RGB", (int(width * scale), int(height * scale)))
+    image.thumbnail(
+        (max_side, max_side), Image.Resampling.LANCZOS, reducing_gap=None
+    )
+    # Поворот по EXIF делаем уже на уменьшенной копии.
+    image = ImageOps.exif_transpose(image)
+    result = tempfile.TemporaryFile()
+    options = {"quality": 90, "optimize": True} if fmt != "GIF" else {}
+    image.save(result, fmt, **options)
+    return result
+
+
+def normalize(upload):
+    """Уменьшает картинку до POST_IMAGE_MAX_SIDE и удаляет EXIF.
+
+    Возвращает File во временном файле с перекодированной картинкой.
+    """
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except Image.DecompressionBombError:
+        raise ValidationError(
+            "Картинка слишком большая.", code="image_too_large"
+        )
+    with image:
+        _check_size(image)
+        fmt = ALIASES.get(image.format, image.format)
+        if fmt not in FORMATS:
+            raise ValidationError(
+                "Неподдерживаемый формат картинки.", code="invalid_image"
+            )
+        # У MPO несколько кадров, но это не анимация.
+        if fmt == image.format and getattr(image, "is_animated", False):
+            result = _strip_animated(image)
+        else:
+            result = _resize(image, fmt, max_side)
+    result.seek(0)
+    name = os.path.basename(upload.name)
+    return File(result, name=name)
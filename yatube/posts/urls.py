@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, feeds, views
 
 app_name = "posts"
 urlpatterns = [
@@ -13,6 +13,12 @@ urlpatterns = [
     path(
         "posts/<int:post_id>/comment/", views.add_comment, name="add_comment"
     ),
+    path(
+        "posts/<int:post_id>/comments/",
+        views.comments_more,
+        name="comments_more",
+    ),
+    path("search/", views.post_search, name="post_search"),
     path("follow/", views.follow_index, name="follow_index"),
     path(
         "profile/<str:username>/follow/",
@@ -24,4 +30,21 @@ urlpatterns = [
         views.profile_unfollow,
         name="profile_unfollow",
     ),
+    path("rss/", feeds.index_rss, name="feed_rss"),
+    path("atom/", feeds.index_atom, name="feed_atom"),
+    path("group/<slug:slug>/rss/", feeds.group_rss, name="group_rss"),
+    path("group/<slug:slug>/atom/", feeds.group_atom, name="group_atom"),
+    path(
+        "profile/<str:username>/rss/", feeds.author_rss, name="profile_rss"
+    ),
+    path(
+        "profile/<str:username>/atom/",
+        feeds.author_atom,
+        name="profile_atom",
+    ),
+    path("api/posts/", api.index, name="api_index"),
+    path("api/posts/<int:post_id>/", api.post_detail, name="api_post"),
+    path("api/group/<slug:slug>/", api.group_posts, name="api_group"),
+    path("api/profile/<str:username>/", api.profile, name="api_profile"),
+    path("api/follow/", api.follow_index, name="api_follow"),
 ]
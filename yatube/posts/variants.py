@@ -0,0 +1,88 @@
+"""Адаптивные варианты картинок постов.
+
+Для каждой картинки строится набор ширин в WebP и JPEG с теми же
+пропорциями и кадрированием, что и миниатюра ленты. Варианты
+записываются в таблицу ImageVariant, по которой шаблоны собирают
+srcset для <picture>.
+"""
+import os
+from collections import defaultdict
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .models import ImageVariant
+
+WIDTHS = (320, 480, 720, 960)
+FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+# Пропорции миниатюры 960x339 из шаблонов ленты.
+ASPECT = 339 / 960
+QUALITY = 80
+
+
+def encode(image, width, fmt, quality=QUALITY):
+    size = (width, round(width * ASPECT))
+    resized = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    resized.save(buffer, FORMATS[fmt], quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def build(name):
+    """Строит все варианты картинки и заменяет ими прежние."""
+    with default_storage.open(name) as source:
+        image = Image.open(source)
+        image.load()
+    image = image.convert("RGB")
+    stem = os.path.splitext(os.path.basename(name))[0]
+    variants = []
+    for fmt in FORMATS:
+        for width in WIDTHS:
+            data = encode(image, width, fmt)
+            variant = ImageVariant(
+                source=name, width=width, format=fmt, size=len(data)
+            )
+            # Подкаталог по первым знакам хеша, как у оригиналов, чтобы
+            # каталог variants/ не рос одним плоским списком.
+            variant.file.save(
+                f"{stem[:2]}/{stem}_{width}.{fmt}",
+                ContentFile(data),
+                save=False,
+            )
+            variants.append(variant)
+    with transaction.atomic():
+        delete(name)
+        ImageVariant.objects.bulk_create(variants)
+    return variants
+
+
+def exist(name):
+    return ImageVariant.objects.filter(source=name).exists()
+
+
+def delete(name):
+    """Удаляет варианты картинки вместе с файлами."""
+    old = ImageVariant.objects.filter(source=name)
+    for path in old.values_list("file", flat=True):
+        default_storage.delete(path)
+    old.delete()
+
+
+def srcsets(names):
+    """Собирает srcset по форматам для нескольких картинок одним
+    запросом: {имя: {"webp": "url 320w, ...", "jpeg": ...}}."""
+    candidates = defaultdict(lambda: defaultdict(list))
+    variants = ImageVariant.objects.filter(source__in=set(names)).order_by(
+        "width"
+    )
+    for variant in variants:
+        candidates[variant.source][variant.format].append(
+            f"{variant.file.url} {variant.width}w"
+        )
+    return {
+        name: {fmt: ", ".join(urls) for fmt, urls in formats.items()}
+        for name, formats in candidates.items()
+    }
@@ -1,47 +1,102 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
+from . import fragments, groups, pagecache, search, thumbnails
+from .counters import get_user_stats
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import Comment, Follow, Group, Post, TimelineEntry, User
+from .paginator import CursorPaginator
+from .scopes import (
+    group_scopes,
+    index_scopes,
+    post_scopes,
+    profile_scopes,
+)
 
 
-def _get_page_obj(request, post_list):
-    paginator = Paginator(post_list, settings.NUMBER_POSTS)
+def _get_page_obj(request, post_list, keys=("pub_date", "id")):
     page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+    if page_number is not None:
+        # Старые ссылки вида ?page=N продолжают работать.
+        paginator = Paginator(post_list, settings.NUMBER_POSTS)
+        return paginator.get_page(page_number)
+    paginator = CursorPaginator(post_list, settings.NUMBER_POSTS, keys=keys)
+    return paginator.get_page(
+        after=request.GET.get("after"),
+        before=request.GET.get("before"),
+    )
+
+
+def _get_comments_page(post_id, after=None):
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        "author"
+    )
+    paginator = CursorPaginator(
+        comments, settings.NUMBER_COMMENTS, keys=("created", "id")
+    )
+    return paginator.get_page(after=after)
+
+
+def _schedule_thumbnails(post):
+    if post.image:
+        name = post.image.name
+        transaction.on_commit(lambda: thumbnails.schedule(name))
 
 
+# Параметры запроса, которые читает _get_page_obj.
+PAGE_PARAMS = ("page", "after", "before")
+
+
+def _fragment_cache(*scopes):
+    return {
+        "cache_timeout": settings.FRAGMENT_CACHE_TIMEOUT,
+        "cache_version": fragments.get_version(*scopes),
+    }
+
+
+@pagecache.cache_anonymous_page(index_scopes, PAGE_PARAMS)
 def index(request):
     template = "posts/index.html"
-    post_list = Post.objects.select_related("group", "author")
-    page_obj = _get_page_obj(request, post_list)
+    post_list = Post.objects.select_related("author")
+    page_obj = groups.attach(_get_page_obj(request, post_list))
     context = {
         "page_obj": page_obj,
+        **_fragment_cache("index"),
     }
     return render(request, template, context)
 
 
+@pagecache.cache_anonymous_page(group_scopes, PAGE_PARAMS)
 def group_posts(request, slug):
     template = "posts/group_list.html"
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related("group", "author")
-    page_obj = _get_page_obj(request, posts)
+    group = groups.get_by_slug(slug)
+    if group is None:
+        raise Http404
+    posts = Post.objects.filter(group_id=group.pk).select_related("author")
+    page_obj = groups.attach(_get_page_obj(request, posts))
     context = {
         "group": group,
+        # Счётчик читается, только когда фрагмент страницы устарел.
+        "posts_count": lambda: Group.objects.values_list(
+            "posts_count", flat=True
+        ).get(pk=group.pk),
         "page_obj": page_obj,
+        **_fragment_cache(f"group:{group.pk}"),
     }
     return render(request, template, context)
 
 
+@pagecache.cache_anonymous_page(profile_scopes, PAGE_PARAMS)
 def profile(request, username):
     template = "posts/profile.html"
     author = get_object_or_404(User, username=username)
-    posts = author.posts.select_related("group", "author")
-    number_posts = posts.count()
-    page_obj = _get_page_obj(request, posts)
+    posts = author.posts.select_related("author")
+    stats = get_user_stats(author)
+    page_obj = groups.attach(_get_page_obj(request, posts))
     following = (
         request.user.is_authenticated
         and Follow.objects.filter(
@@ -50,31 +105,79 @@ def profile(request, username):
         ).exists()
     )
     context = {
-        "number_posts": number_posts,
+        "number_posts": stats.posts_count,
+        "stats": stats,
         "author": author,
         "page_obj": page_obj,
         "following": following,
+        **_fragment_cache(f"author:{author.pk}", "groups"),
     }
     return render(request, template, context)
 
 
+@pagecache.cache_anonymous_page(post_scopes)
 def post_detail(request, post_id):
     template = "posts/post_detail.html"
-    post = get_object_or_404(Post, id=post_id)
-    author = post.author
-    number_posts = Post.objects.filter(author=author).count()
+    post = get_object_or_404(
+        Post.objects.select_related("author__stats"), id=post_id
+    )
+    groups.attach([post])
+    stats = get_user_stats(post.author)
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    comments = _get_comments_page(post.pk)
     context = {
-        "number_posts": number_posts,
+        "number_posts": stats.posts_count,
         "post": post,
         "form": form,
         "comments": comments,
+        **_fragment_cache(f"post:{post.pk}"),
     }
     return render(request, template, context)
 
 
+@pagecache.cache_anonymous_page(
+    lambda post_id: (f"post:{post_id}",), ("after", "format")
+)
+def comments_more(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    comments = _get_comments_page(post_id, after=request.GET.get("after"))
+    if request.GET.get("format") == "json":
+        return JsonResponse(
+            {
+                "comments": [
+                    {
+                        "id": comment.pk,
+                        "author": comment.author.username,
+                        "text": comment.text,
+                        "created": comment.created,
+                    }
+                    for comment in comments
+                ],
+                "next": comments.next_cursor,
+            }
+        )
+    context = {
+        "comments": comments,
+        "post_id": post_id,
+    }
+    return render(request, "includes/comment_list.html", context)
+
+
+def post_search(request):
+    query = request.GET.get("q", "").strip()
+    page_obj = search.search(
+        query, settings.NUMBER_POSTS, after=request.GET.get("after")
+    )
+    context = {
+        "query": query,
+        "page_obj": page_obj,
+    }
+    return render(request, "posts/search.html", context)
+
+
 @login_required
+@transaction.atomic
 def post_create(request):
     is_edit = False
     template = "posts/create_post.html"
@@ -91,11 +194,13 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        _schedule_thumbnails(post)
         return redirect("posts:profile", request.user)
     return render(request, template, context)
 
 
 @login_required
+@transaction.atomic
 def post_edit(request, post_id):
     is_edit = True
     template = "posts/create_post.html"
@@ -114,11 +219,14 @@ def post_edit(request, post_id):
         return redirect("posts:post_detail", post_id=post_id)
     if form.is_valid():
         form.save()
+        if "image" in form.changed_data:
+            _schedule_thumbnails(post)
         return redirect("posts:post_detail", post_id=post_id)
     return render(request, template, context)
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -133,30 +241,32 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     template = "posts/follow.html"
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = _get_page_obj(request, posts)
+    entries = TimelineEntry.objects.filter(user=request.user).select_related(
+        "post__author"
+    )
+    page_obj = _get_page_obj(request, entries, keys=("pub_date", "post_id"))
+    page_obj.object_list = groups.attach([entry.post for entry in page_obj])
     context = {
         "page_obj": page_obj,
+        **_fragment_cache("index", f"follower:{request.user.pk}"),
     }
     return render(request, template, context)
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    condition = not Follow.objects.filter(
-        user=request.user, author=author
-    ).exists()
     if author.id != request.user.id:
-        if condition:
-            Follow.objects.create(
-                user=request.user,
-                author=author,
-            )
+        Follow.objects.get_or_create(
+            user=request.user,
+            author=author,
+        )
     return redirect("posts:profile", username=username)
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(
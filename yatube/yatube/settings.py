@@ -11,7 +11,9 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -47,6 +49,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.sitemaps",
     "sorl.thumbnail",
     "debug_toolbar",
 ]
@@ -142,19 +145,73 @@ EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 NUMBER_POSTS = 10
+NUMBER_COMMENTS = 20
+NUMBER_FEED_ITEMS = 20
 
 
 CSRF_FAILURE_VIEW = "core.views.csrf_failure"
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
-
+# Кто отдаёт байты медиафайлов: "" — сам Django, "nginx" — по
+# X-Accel-Redirect во внутренний location MEDIA_ACCEL_PREFIX,
+# "sendfile" — по X-Sendfile (Apache mod_xsendfile, lighttpd).
+MEDIA_ACCEL = os.getenv("MEDIA_ACCEL", "")
+MEDIA_ACCEL_PREFIX = os.getenv("MEDIA_ACCEL_PREFIX", "/protected-media/")
+# Путь к функции check(request, path) -> bool, которая решает, можно
+# ли отдать файл; пусто — все файлы, кроме скрытых, публичные.
+MEDIA_ACCESS_CHECK = os.getenv("MEDIA_ACCESS_CHECK", "")
+# Имена картинок и миниатюр строятся по содержимому и не меняются.
+MEDIA_MAX_AGE = 60 * 60 * 24 * 365
+# Загруженные картинки уменьшаются до этой стороны, а картинки
+# больше POST_IMAGE_MAX_PIXELS отклоняются без декодирования.
+POST_IMAGE_MAX_SIDE = 2560
+POST_IMAGE_MAX_PIXELS = 50_000_000
+# Файл без ссылок моложе стольких секунд не удаляется сразу: его могла
+# переиспользовать загрузка, пост которой ещё не сохранён. Такие файлы
+# позже убирает collect_media.
+MEDIA_COLLECT_MIN_AGE = 10 * 60
+# Потоки для фонового построения миниатюр, 0 — строить сразу.
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", 2))
+
+# Общий для всех воркеров кеш выбирается переменными окружения:
+# CACHE_BACKEND=locmem|file|redis и CACHE_LOCATION. Для redis адрес
+# может быть сокетом: unix:///run/redis/redis.sock.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "locmem")
+CACHE_LOCATION = os.getenv("CACHE_LOCATION")
+CACHE_PRESETS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": CACHE_LOCATION
+        or os.path.join(tempfile.gettempdir(), "yatube-cache"),
+    },
+    "redis": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": CACHE_LOCATION or "redis://127.0.0.1:6379",
+    },
+}
+if CACHE_BACKEND not in CACHE_PRESETS:
+    raise ImproperlyConfigured(
+        f"Неизвестный CACHE_BACKEND={CACHE_BACKEND!r}, "
+        f"допустимо: {', '.join(CACHE_PRESETS)}"
+    )
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        **CACHE_PRESETS[CACHE_BACKEND],
+        "KEY_PREFIX": os.getenv("CACHE_KEY_PREFIX", "yatube"),
     }
 }
 
+# Фрагменты шаблонов инвалидируются сигналами, поэтому живут долго.
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 6
+# Страницы для анонимных посетителей, см. posts.pagecache.
+PAGE_CACHE_TIMEOUT = 60 * 60
+# Как часто процесс сверяет версию своего кеша групп, см. posts.groups.
+GROUP_CACHE_CHECK_INTERVAL = 1
+
 INTERNAL_IPS = [
     "127.0.0.1",
 ]
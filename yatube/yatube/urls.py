@@ -14,24 +14,33 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from core import media
+from posts import sitemaps
+
 urlpatterns = [
     path("", include("posts.urls", namespace="posts")),
     path("admin/", admin.site.urls),
     path("auth/", include("users.urls", namespace="users")),
     path("auth/", include("django.contrib.auth.urls")),
     path("about/", include("about.urls", namespace="about")),
+    path(
+        settings.MEDIA_URL.lstrip("/") + "<path:path>",
+        media.serve,
+        name="media",
+    ),
+    path("sitemap.xml", sitemaps.index, name="sitemap"),
+    path(
+        "sitemap-<slug:section>-<int:page>.xml",
+        sitemaps.section,
+        name="sitemap_section",
+    ),
 ]
 
 handler403 = "core.views.csrf_failure"
 handler404 = "core.views.page_not_found"
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )
 if settings.DEBUG:
     import debug_toolbar
 